@@ -1,72 +1,90 @@
-import NiRyo_ChaikMat_Ecosyspro as rob
-import ChaikmatWLKATA as willie
+import asyncio
 import os, random, time
-import multitasking
+from aas_repository import AASError
+from async_services import robot_cell
+from client import state_publisher
 
-# Initialize robots
-chaikmat_ned = rob.ChaikNiRyo()
-chaikmat_ned.setup()
-chaikmat_wl = willie.ChaikWLKATA()
+# Robots, created in main(): one event loop drives both of them and the OPC UA session
+chaikmat_ned = None
+chaikmat_wl = None
 
-# AAS File Paths
-ned_aas_file = "~/Runchain_Services/NiryoNed2AAS.aas.xml"
-wl_aas_file = "~/Runchain_Services/WlkataMirobotAAS.aas.xml"
+# AAS File Paths (the AASX packages downloaded by client.py, read without unpacking)
+ned_aas_file = "~/Runchain_Services/NiryoNed2AAS.aasx"
+wl_aas_file = "~/Runchain_Services/WlkataMirobotAAS.aasx"
 
 arch_file_path = "/media/chaikmat/4621-0000/arch.txt"
 
-def pick_replace():
+# Ned cycle: load and convey a piece in one service, the arm waiting at the observation point
+LOAD_AND_CONVEY = True
+
+async def pick_replace():
     # Update robot state to Active before operation
-    chaikmat_ned.robot_state_update(ned_aas_file, "Active")
+    await chaikmat_ned.robot_state_update("Active")
     
     # Check and perform Load Piece service for NiRyo
-    if "Error" in chaikmat_ned.service_query(ned_aas_file, "Pick"):
+    try:
+        await chaikmat_ned.service_query("Pick")
+    except AASError:
         print("Service 'Pick' not available in NiRyo AAS.")
-        chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
+        await chaikmat_ned.robot_state_update("Idle")
         return
-    chaikmat_ned.load_piece()
 
     # Check and perform Convey Until Detect service for NiRyo
-    if "Error" in chaikmat_ned.service_query(ned_aas_file, "Convey"):
+    try:
+        await chaikmat_ned.service_query("Convey")
+    except AASError:
         print("Service 'Convey' not available in NiRyo AAS.")
-        chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
+        await chaikmat_ned.robot_state_update("Idle")
         return
-    chaikmat_ned.convey_until_detect()
+    if LOAD_AND_CONVEY:
+        await chaikmat_ned.load_and_convey()
+    else:
+        await chaikmat_ned.load_piece()
+        await chaikmat_ned.convey_until_detect()
 
     # Check and perform Color and Shape Detection service for NiRyo
-    if "Error" in chaikmat_ned.service_query(ned_aas_file, "ColorAndShapeDetection"):
+    try:
+        await chaikmat_ned.service_query("ColorAndShapeDetection")
+    except AASError:
         print("Service 'ColorAndShapeDetection' not available in NiRyo AAS.")
-        chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
+        await chaikmat_ned.robot_state_update("Idle")
         return
-    available = chaikmat_ned.object_chars()
+    available = await chaikmat_ned.call("object_chars")
     print(available)
 
     # Check and perform Vision Pick service for NiRyo
-    if "Error" in chaikmat_ned.service_query(ned_aas_file, "Pick"):
+    try:
+        await chaikmat_ned.service_query("Pick")
+    except AASError:
         print("Service 'Pick' not available in NiRyo AAS.")
-        chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
+        await chaikmat_ned.robot_state_update("Idle")
         return
-    chaikmat_ned.vpick()
+    await chaikmat_ned.call("vpick")
 
     # Check and perform Place service for NiRyo
-    if "Error" in chaikmat_ned.service_query(ned_aas_file, "Place"):
+    try:
+        await chaikmat_ned.service_query("Place")
+    except AASError:
         print("Service 'Place' not available in NiRyo AAS.")
-        chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
+        await chaikmat_ned.robot_state_update("Idle")
         return
-    chaikmat_ned.put_back_piece()
+    await chaikmat_ned.put_back_piece()
 
     # Update robot state to Idle after operation
-    chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
+    await chaikmat_ned.robot_state_update("Idle")
 
-def vision_test():
-    chaikmat_ned.robot_state_update(ned_aas_file, "Active")
+async def vision_test():
+    await chaikmat_ned.robot_state_update("Active")
 
-    if "Error" in chaikmat_ned.service_query(ned_aas_file, "ColorAndShapeDetection"):
+    try:
+        await chaikmat_ned.service_query("ColorAndShapeDetection")
+    except AASError:
         print("Service 'ColorAndShapeDetection' not available in NiRyo AAS.")
-        chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
+        await chaikmat_ned.robot_state_update("Idle")
         return
-    chaikmat_ned.select_object()
+    await chaikmat_ned.call("select_object")
 
-    chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
+    await chaikmat_ned.robot_state_update("Idle")
 
 def parse_arches(file_path):
     arches = {}
@@ -87,8 +105,7 @@ def parse_arches(file_path):
     print(arches)
     return arches
 
-@multitasking.task
-def build_arches(file, arches):
+async def build_arches(file, arches):
     print("start building")
     if file != "nofile":
         with open(arch_file_path, 'r') as f:
@@ -96,91 +113,119 @@ def build_arches(file, arches):
             for line in lines:
                 print(line.strip())
     
-    number = -1
-    for arch in arches:
-        number += 1
-        found = 0
-        chaikmat_ned.neutral()
-        shape = arches[arch].get('shape')
-        color = arches[arch].get('color')
-        while found == 0:
-            chaikmat_ned.robot_state_update(ned_aas_file, "Active")
-
-            if "Error" in chaikmat_ned.service_query(ned_aas_file, "Pick"):
-                print("Service 'Pick' not available in NiRyo AAS.")
-                chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
-                return
-            chaikmat_ned.load_piece()
-
-            if "Error" in chaikmat_ned.service_query(ned_aas_file, "Convey"):
-                print("Service 'Convey' not available in NiRyo AAS.")
-                chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
-                return
-            chaikmat_ned.convey_until_detect()
-
-            if "Error" in chaikmat_ned.service_query(ned_aas_file, "Pick"):
-                print("Service 'Pick' not available in NiRyo AAS.")
-                chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
-                return
-            found = chaikmat_ned.pick_my_thing(shape, color, number)
-
-        chaikmat_ned.robot_state_update(ned_aas_file, "Idle")
-    chaikmat_ned.neutral()
-    chaikmat_ned.close_xml()
-
-    chaikmat_wl.robot_state_update(wl_aas_file, "Active")
+    # Arch slots still to build (numbers of the arches points) and the shape and color of their piece
+    plan = {number: (arches[arch].get('shape'), arches[arch].get('color')) for number, arch in enumerate(arches)}
+    await chaikmat_ned.call("neutral")
+    while plan:
+        await chaikmat_ned.robot_state_update("Active")
+
+        try:
+            await chaikmat_ned.service_query("Pick")
+        except AASError:
+            print("Service 'Pick' not available in NiRyo AAS.")
+            await chaikmat_ned.robot_state_update("Idle")
+            return
+
+        # Any piece of the workspace still needed by the plan goes to its slot (removed from plan)
+        if await chaikmat_ned.pick_for_plan(plan):
+            continue
+
+        # None is needed: bring a new piece
+        try:
+            await chaikmat_ned.service_query("Convey")
+        except AASError:
+            print("Service 'Convey' not available in NiRyo AAS.")
+            await chaikmat_ned.robot_state_update("Idle")
+            return
+        if LOAD_AND_CONVEY:
+            await chaikmat_ned.load_and_convey()
+        else:
+            await chaikmat_ned.load_piece()
+            await chaikmat_ned.convey_until_detect()
+
+    await chaikmat_ned.robot_state_update("Idle")
+    await chaikmat_ned.call("neutral")
+    await chaikmat_ned.call("close_xml")
+
+    await chaikmat_wl.robot_state_update("Active")
 
     # Check and perform Move Conveyor service for Wlkata
-    if "Error" in chaikmat_wl.service_query(wl_aas_file, "Move"):
+    try:
+        await chaikmat_wl.service_query("Move")
+    except AASError:
         print("Service 'Move' not available in Wlkata AAS.")
-        chaikmat_wl.robot_state_update(wl_aas_file, "Idle")
+        await chaikmat_wl.robot_state_update("Idle")
         return
-    chaikmat_wl.move_conveyor(100)
-
-    chaikmat_wl.robot_state_update(wl_aas_file, "Idle")
-
-@multitasking.task
-def construct(arches):
-    time.sleep(5)
-    build_arches("nofile", arches)
-
-# Set empirical values
-chaikmat_ned.robot.set_brightness(0.78)
-chaikmat_ned.robot.set_contrast(1.5)
-chaikmat_ned.robot.set_saturation(0.7)
-
-userchoice = "None"
-while userchoice != "q":
-    userchoice = input("\n\nredefine setup: s \nNew Workspace: w \npicking and replace: p \nDefine arches building points: b\nDefine and build new Arch: n \nLoad and build arch from file: l\nTest vision: v\nquit: q\nYour choice? ")
-    if userchoice == "p":
-        pick_replace()
-    elif userchoice == "s":
-        chaikmat_ned.reconfigure()
-    elif userchoice == "v":
-        vision_test()
-    elif userchoice == "n":
-        arches = parse_arches(arch_file_path)
-        construct(arches)
-    elif userchoice == "l":
-        arches = parse_arches(arch_file_path)
-        build_arches("nofile", arches)
-    elif userchoice == "w":
-        chaikmat_ned.new_workspace()
-    elif userchoice == "b":
-        chaikmat_ned.define_arches_points()
-    elif userchoice == "q":
-        print("Quitting program.")
-    else:
-        print("Unknown command:", userchoice)
-
-    # Example of dynamically configuring a service (Commented out):
-    # chaikmat_ned.configure_service(ned_aas_file, "NewService", "input_value", "output_value", "driver_function", "effector")
-    # chaikmat_wl.configure_service(wl_aas_file, "NewService", "input_value", "output_value", "driver_function", "effector")
-
-    # Example of dynamically adding a service (Commented out):
-    # chaikmat_ned.add_service(ned_aas_file, "NewService", "input_value", "output_value", "driver_function", "effector")
-    # chaikmat_wl.add_service(wl_aas_file, "NewService", "input_value", "output_value", "driver_function", "effector")
-
-    # Example of dynamically removing a service (Commented out):
-    # chaikmat_ned.remove_service(ned_aas_file, "ServiceToRemove")
-    # chaikmat_wl.remove_service(wl_aas_file, "ServiceToRemove")
+    await chaikmat_wl.move_conveyor(100)
+
+    await chaikmat_wl.robot_state_update("Idle")
+
+async def construct(arches):
+    await asyncio.sleep(5)
+    await build_arches("nofile", arches)
+
+MENU = "\n\nredefine setup: s \nNew Workspace: w \npicking and replace: p \nDefine arches building points: b\nDefine and build new Arch: n \nLoad and build arch from file: l\nTest vision: v\nquit: q\nYour choice? "
+
+async def main():
+    global chaikmat_ned, chaikmat_wl
+    async with robot_cell(state_publisher) as (chaikmat_ned, chaikmat_wl):
+        # Set empirical values
+        camera = chaikmat_ned.controller.robot
+        await chaikmat_ned.run(camera.set_brightness, 0.78)
+        await chaikmat_ned.run(camera.set_contrast, 1.5)
+        await chaikmat_ned.run(camera.set_saturation, 0.7)
+
+        # Arches built in the background while the menu stays available
+        constructions = set()
+
+        userchoice = "None"
+        while userchoice != "q":
+            userchoice = await asyncio.to_thread(input, MENU)
+            if userchoice == "p":
+                await pick_replace()
+            elif userchoice == "s":
+                await chaikmat_ned.call("reconfigure")
+            elif userchoice == "v":
+                await vision_test()
+            elif userchoice == "n":
+                arches = parse_arches(arch_file_path)
+                task = asyncio.create_task(construct(arches))
+                constructions.add(task)
+                task.add_done_callback(constructions.discard)
+            elif userchoice == "l":
+                arches = parse_arches(arch_file_path)
+                await build_arches("nofile", arches)
+            elif userchoice == "w":
+                await chaikmat_ned.call("new_workspace")
+            elif userchoice == "b":
+                await chaikmat_ned.call("define_arches_points")
+            elif userchoice == "q":
+                print("Quitting program.")
+            else:
+                print("Unknown command:", userchoice)
+
+            # Example of dynamically configuring a service (Commented out):
+            # chaikmat_ned.controller.configure_service(ned_aas_file, "NewService", "input_value", "output_value", "driver_function", "effector")
+            # chaikmat_wl.controller.configure_service(wl_aas_file, "NewService", "input_value", "output_value", "driver_function", "effector")
+
+            # Example of dynamically adding a service (Commented out):
+            # chaikmat_ned.controller.add_service(ned_aas_file, "NewService", "input_value", "output_value", "driver_function", "effector")
+            # chaikmat_wl.controller.add_service(wl_aas_file, "NewService", "input_value", "output_value", "driver_function", "effector")
+
+            # Example of dynamically removing a service (Commented out):
+            # chaikmat_ned.controller.remove_service(ned_aas_file, "ServiceToRemove")
+            # chaikmat_wl.controller.remove_service(wl_aas_file, "ServiceToRemove")
+
+            # Example of reconfiguring several services in one atomic write (Commented out):
+            # with AASTransaction(ned_aas_file) as transaction:
+            #     transaction.remove_service("ServiceToRemove")
+            #     transaction.add_service("NewService", "input_value", "output_value", "driver_function", "effector")
+
+        # Let the arches under construction be finished
+        if constructions:
+            await asyncio.gather(*constructions)
+
+        # Latency of the conveyor IR sensor detections of the session
+        print(chaikmat_ned.controller.detection_latency)
+
+asyncio.run(main())
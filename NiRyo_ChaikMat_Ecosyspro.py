@@ -1,15 +1,76 @@
 from pyniryo import *
 import os, time ,ast 
 from datetime import datetime 
-import xml.etree.ElementTree as ET
-import asyncio
-from client import get_pressure
+from aas_services import AASServiceInterface
+from client import pressure_monitor
+from sensor_wait import EdgeWaiter, LatencyHistogram
+from trajectories import TrajectoryCache
+from workspace_inventory import WorkspaceInventory
 
 # Define the AAS file path for Wlkata
-ned_aas_file = "~/Runchain_Services/NiryoNed2AAS.aas.xml"
+ned_aas_file = "~/Runchain_Services/NiryoNed2AAS.aasx"
 
+# Clearance pose crossed by run_pattern between the pick position and the stations
+ZERO_POSE = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+# Height offset of the vision picks (m)
+VISION_HEIGHT_OFFSET = -0.005
+
+# Default time given to a piece to reach the IR sensor of the conveyor
+DETECTION_TIMEOUT = 10  # s
+
+# Weight of the last cycle in the conveyor transport time estimate
+TIMING_SMOOTHING = 0.3
+
+# Minimum lead of the conveyor transport over the arm travel to the observe point for the
+# conveyor to run during that travel
+TRAVEL_MARGIN = 1.0  # s
+
+# Pressure above which the gripper holds a piece
+GRIP_PRESSURE_THRESHOLD = 0.5  # Replace with an appropriate threshold for object detection
+
+
+class GripCheck:
+    # Grip check after a grasp, yielded by the driver steps (see AASServiceInterface): True when
+    # a pressure sample of the subscription in client.py received after since (a time.monotonic()
+    # instant taken before the grasp command) shows a grip. It returns as soon as one does, and
+    # fails if the pressure has not changed since the grasp within FRESH_SAMPLE_TIMEOUT (the
+    # server publishes changes only). read() waits in the calling thread, get() on the event loop.
+    def __init__(self, since):
+        self.since = since
+
+    @staticmethod
+    def _grip(pressure):
+        return pressure > GRIP_PRESSURE_THRESHOLD
+
+    def _result(self, pressure):
+        if pressure is None:
+            print("Pressure unchanged since the grasp command.")
+            return False
+        print(f"Pressure: {pressure}")
+        return self._grip(pressure)
+
+    def read(self):
+        return self._result(pressure_monitor.read(newer_than=self.since, accept=self._grip))
+
+    async def get(self):
+        return self._result(await pressure_monitor.get(newer_than=self.since, accept=self._grip))
+
+
+class ChaikNiRyo(AASServiceInterface):
+    name = "Niryo"
+    # Services (run by run_service(), and by AsyncChaikNiRyo): AAS services queried, name in the
+    # service metrics and driver steps. They return True on success and False on failure, as
+    # those of ChaikWLKATA.
+    service_steps = {
+        "convey_until_detect": (("PresenceDetectionOnConveyor",), "Convey Until Detect", "convey"),
+        "load_piece": (("Pick",), "Load Piece", "load"),
+        "load_and_convey": (("Pick", "PresenceDetectionOnConveyor"), "Load Piece and Convey", "load_to_observe"),
+        "put_back_piece": (("Place",), "Put Back Piece", "put_back"),
+        "pick_my_thing": (("ColorAndShapeDetection",), "Pick and Place", "pick_expected"),
+        "pick_for_plan": (("ColorAndShapeDetection",), "Pick and Place", "place_needed"),
+    }
 
-class ChaikNiRyo:
     def __init__(self):
         # Set the default IP for the robot
         self.ip = "10.10.10.10"
@@ -25,6 +86,20 @@ class ChaikNiRyo:
         self.reload_point = None
         self.conveyor_starting_point = None
         self.build_point = None
+        # Estimated conveyor transport to the sensor and arm travel from the conveyor to the
+        # observe point (s, learnt from the previous cycles)
+        self.transport_time = None
+        self.observe_travel = None
+        # IR sensor: time given to a piece to reach it, and detection latencies (sensor_wait.py)
+        self.detection_timeout = DETECTION_TIMEOUT
+        self.detection_latency = LatencyHistogram()
+        # Multi-waypoint moves compiled into single smoothed trajectories (trajectories.py)
+        self.trajectories = TrajectoryCache()
+        # Pieces in the workspace, from one camera image (workspace_inventory.py), set up with the robot
+        self.inventory = None
+        # AAS of the asset, served by the shared AAS repository
+        self.ned_aas_file = self.aas_file = ned_aas_file
+        self.load_shell()
 
 
     def read_coordinates_from_file(self, file_path):
@@ -68,7 +143,10 @@ class ChaikNiRyo:
     def setup(self):
         # Initialize the robot with the provided IP
         self.robot = NiryoRobot(self.ip)
+        self.inventory = WorkspaceInventory(self.robot)
         self.robot.calibrate_auto()
+        # Subscribe to the vPLC pressure so grasp checks are served locally
+        pressure_monitor.start()
         
         # Read coordinates from the file
         coordinates = self.read_coordinates_from_file("points_coordinates.txt")
@@ -151,23 +229,26 @@ class ChaikNiRyo:
             try:
                 print("reading sensor")
                 print(self.robot.digital_read(self.sensor))
-                while self.robot.digital_read(self.sensor) == PinState.HIGH:
-                    self.robot.wait(0.1)
+                detected = self.wait_for_piece()
                 self.robot.stop_conveyor(self.conveyor_id)
             except:
                 # Handle any sensor errors
                 print("error sensor")
                 self.robot.stop_conveyor(self.conveyor_id)
+            else:
+                if not detected:
+                    print("No piece reached the sensor, pattern stopped.")
+                    self.robot.move_pose(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+                    return
             # Move the robot to the pick position, grasp the object, and then move to the defined position to release the object
-            self.robot.move_pose(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
-            self.robot.move_pose(final_pick_position)
+            self.move_through(ZERO_POSE, final_pick_position)
+            grasp_start = time.monotonic()
             self.robot.grasp_with_tool()
-            if not asyncio.run(self.check_pressure()):
+            if not self.check_pressure(since=grasp_start):
                 print("No object detected in the grip. Grasp failed.")
                 self.robot.release_with_tool()
                 return
-            self.robot.move_pose(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
-            self.robot.move_pose(final_position)
+            self.move_through(ZERO_POSE, final_position)
             self.robot.release_with_tool()
         # Move the robot back to the initial position and stop the conveyor
         self.robot.move_pose(0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
@@ -288,14 +369,18 @@ class ChaikNiRyo:
             print("Unknown command: %s", userchoice)
 
     def object_chars(self):
-        # Move to observe point and detect objects
+        # Move to observe point and detect every object in the workspace
         print("Moving to observe point to detect objects...")
-        self.robot.move_pose(self.observe_point)
-        self.xml_update("observe_point", self.observe_point)
-        things = self.robot.detect_object(self.wp_name, shape=ObjectShape.ANY, color=ObjectColor.ANY)
+        things = self.scan_workspace()
         print("Objects detected:", things)
         return things
 
+    def scan_workspace(self):
+        # Takes the inventory of the workspace from the observe point, returns the pieces found
+        self.robot.move_pose(self.observe_point)
+        self.xml_update("observe_point", self.observe_point)
+        return self.inventory.scan()
+
     def select_object(self):
         # Move to observe point and select object
         print("Moving to observe point to select object...")
@@ -307,7 +392,8 @@ class ChaikNiRyo:
 
     def vpick(self, s=ObjectShape.ANY, c=ObjectColor.ANY):
         print(f"Vision picking object with shape {s} and color {c}...")
-        self.robot.vision_pick(self.wp_name, height_offset=-0.005, shape=s, color=c)
+        self.robot.vision_pick(self.wp_name, height_offset=VISION_HEIGHT_OFFSET, shape=s, color=c)
+        self.inventory.stale = True
 
     def neutral(self):
         print("Moving to neutral position (observe point)...")
@@ -315,112 +401,154 @@ class ChaikNiRyo:
         self.xml_update("observe_point", self.observe_point)
 
     def convey_until_detect(self):
-        # Update robot state to Active before operation
-        self.robot_state_update(self.ned_aas_file, "Active")
-        start_time = time.time()
-
-        # Check service availability
-        if "Error" in self.service_query(self.ned_aas_file, "PresenceDetectionOnConveyor"):
-            print("Service 'PresenceDetectionOnConveyor' not available in Niryo AAS.")
-            self.robot_state_update(self.ned_aas_file, "Idle")
-            return
-
-        print("Running conveyor until detection...")
-        self.robot.run_conveyor(self.conveyor_id)
-        detected = 1
+        return self.run_service("convey_until_detect")
+
+    def convey(self, conveyor_start=None):
+        # Driver part of convey_until_detect: returns True if the sensor detected a piece. With
+        # conveyor_start, the time.perf_counter() instant it was started at, the conveyor is
+        # already running
+        if conveyor_start is None:
+            print("Running conveyor until detection...")
+            self.robot.run_conveyor(self.conveyor_id)
+            conveyor_start = time.perf_counter()
+        detected = True
         try:
             print("Reading sensor...")
             print(self.robot.digital_read(self.sensor))
-            tic = time.perf_counter()
-            while self.robot.digital_read(self.sensor) == PinState.HIGH:
-                self.robot.wait(0.1)
-                toc = time.perf_counter()
-                if toc - tic > 10:
-                    self.logfile.write("Unsuccessful Picking attempt\n")
-                    self.logfile.flush()
-                    self.xml_update("ir_detection", 0)
-                    detected = 0
-                    break
+            elapsed = time.perf_counter() - conveyor_start
+            expected = self.transport_time - elapsed if self.transport_time is not None else None
+            if self.wait_for_piece(max(self.detection_timeout - elapsed, 0), expected):
+                self.transport_time = self._smooth(self.transport_time, time.perf_counter() - conveyor_start)
+            else:
+                self.logfile.write("Unsuccessful Picking attempt\n")
+                self.logfile.flush()
+                self.xml_update("ir_detection", 0)
+                detected = False
             self.robot.stop_conveyor(self.conveyor_id)
         except:
             # Handle any sensor errors
             print("Error with sensor")
             self.robot.stop_conveyor(self.conveyor_id)
             self.xml_update("ir_detection", 0)
-            detected = 0
-        if detected == 1:
+            detected = False
+        if detected:
             self.xml_update("ir_detection", 1)
+            self.inventory.stale = True
+        return detected
+
+    def wait_for_piece(self, timeout=None, expected=None):
+        # Waits for the IR sensor to see a piece; returns False after timeout seconds (default:
+        # detection_timeout). With expected, the number of seconds after which the piece should
+        # arrive, the sensor is polled slowly until shortly before, then at short intervals.
+        waiter = EdgeWaiter(lambda: self.robot.digital_read(self.sensor), PinState.LOW,
+                            histogram=self.detection_latency)
+        return waiter.wait(timeout if timeout is not None else self.detection_timeout, expected)
+
+    def load_and_convey(self):
+        # Load Piece and Convey Until Detect in one service, the arm waiting for the piece at
+        # the observe point
+        return self.run_service("load_and_convey")
+
+    def load_to_observe(self):
+        # Driver part of load_and_convey (generator steps, see load())
+        return (yield from self.load()) and self.convey_to_observe()
+
+    def convey_to_observe(self):
+        # Driver part of load_and_convey, once the piece is released on the conveyor: the arm goes
+        # to the observe point and the conveyor runs until the sensor detects the piece. Returns
+        # True if it did. pyniryo executes one command at a time, so the sensor cannot be read
+        # during the move: the conveyor only runs during it when the learnt transport time exceeds
+        # the learnt travel by TRAVEL_MARGIN, the piece then reaching the sensor after the arm has
+        # arrived. Otherwise it is started once the arm is still. The sensor is read before the
+        # move, the conveyor not being started while a piece is in front of it, and right after.
+        try:
+            blocked = self.robot.digital_read(self.sensor) == PinState.LOW
+        except:
+            # Handle any sensor errors
+            print("Error with sensor")
+            self.xml_update("ir_detection", 0)
+            return False
+        overlap = (not blocked and self.transport_time is not None and self.observe_travel is not None
+                   and self.transport_time > self.observe_travel + TRAVEL_MARGIN)
+        conveyor_start = None
+        if overlap:
+            print("Running conveyor during the travel to the observe point...")
+            self.robot.run_conveyor(self.conveyor_id)
+            conveyor_start = time.perf_counter()
+        travel_start = time.perf_counter()
+        try:
+            self.robot.move_pose(self.observe_point)
+        except:
+            if overlap:
+                self.robot.stop_conveyor(self.conveyor_id)
+            raise
+        travel = time.perf_counter() - travel_start
+        self.observe_travel = self._smooth(self.observe_travel, travel)
+        self.xml_update("observe_point", self.observe_point)
+        if blocked:
+            print("A piece is already in front of the sensor, conveyor not started.")
+            self.xml_update("ir_detection", 1)
+            self.inventory.stale = True
+            return True
+        if overlap and time.perf_counter() - conveyor_start > self.transport_time - TRAVEL_MARGIN:
+            print("The travel outlasted the conveyor margin, the piece may have passed the sensor.")
+        return self.convey(conveyor_start)
 
-        # Log success
-        end_time = time.time()
-        execution_time = end_time - start_time
-        self.service_logs("Convey Until Detect", True, execution_time)
-
-        # Update robot state to Idle after operation
-        self.robot_state_update(self.ned_aas_file, "Idle")
+    def _smooth(self, estimate, measure):
+        if estimate is None:
+            return measure
+        return (1 - TIMING_SMOOTHING) * estimate + TIMING_SMOOTHING * measure
 
     def load_piece(self):
-        start_time = time.time()
-        # Update robot state to Active before operation
-        self.robot_state_update(self.ned_aas_file, "Active")
-        
-        # Check service availability
-        if "Error" in self.service_query(self.ned_aas_file, "Pick"):
-            print("Service 'Pick' not available in Niryo AAS.")
-            self.robot_state_update(self.ned_aas_file, "Idle")
-            return
+        return self.run_service("load_piece")
+
+    def load(self):
+        # Driver part of load_piece: returns False if the grip check fails after the grasp. The
+        # check is yielded, so that the asynchronous API awaits it instead of blocking the robot's
+        # thread
+        grasp_start = self.grasp_piece()
+        if not (yield GripCheck(grasp_start)):
+            print("No object detected in the grip. Grasp failed.")
+            self.robot.release_with_tool()
+            return False
+        self.drop_on_conveyor()
+        return True
 
+    def grasp_piece(self):
+        # Step of load, up to the grasp: returns the time.monotonic() instant the grasp command
+        # was sent, for the grip check
         print("Loading piece...")
-        self.robot.move_pose(self.safe_pickpoint)
+        self.move_through(self.safe_pickpoint, self.pickpoint)
         self.xml_update("safe_pickpoint", self.safe_pickpoint)
-        self.robot.move_pose(self.pickpoint)
         self.xml_update("pickpoint", self.pickpoint)
+        grasp_start = time.monotonic()
         self.robot.grasp_with_tool()
-        if not asyncio.run(self.check_pressure()):
-            print("No object detected in the grip. Grasp failed.")
-            self.robot.release_with_tool()
-            self.robot_state_update(self.ned_aas_file, "Idle")
-            return
+        return grasp_start
 
-        self.robot.move_pose(self.safe_pickpoint)
+    def drop_on_conveyor(self):
+        # Step of load, after a successful grasp
+        self.move_through(self.safe_pickpoint, self.conveyor_starting_point)
         self.xml_update("safe_pickpoint", self.safe_pickpoint)
-        self.robot.move_pose(self.conveyor_starting_point)
         self.xml_update("safe_pickpoint", self.conveyor_starting_point)
         self.robot.release_with_tool()
 
-        # Log success
-        end_time = time.time()
-        execution_time = end_time - start_time
-        self.service_logs("Load Piece", True, execution_time)
-
-        # Update robot state to Idle after operation
-        self.robot_state_update(self.ned_aas_file, "Idle")
+    def move_through(self, *points):
+        # Moves the arm through points in a single smoothed trajectory, stopping on the last one
+        self.trajectories.execute(self.robot, points)
 
     def put_back_piece(self):
-        start_time = time.time()
-        # Update robot state to Active before operation
-        self.robot_state_update(self.ned_aas_file, "Active")
-
-        # Check service availability
-        if "Error" in self.service_query(self.ned_aas_file, "Place"):
-            print("Service 'Place' not available in Niryo AAS.")
-            self.robot_state_update(self.ned_aas_file, "Idle")
-            return
+        return self.run_service("put_back_piece")
 
+    def put_back(self):
+        # Driver part of put_back_piece
         print("Putting back piece...")
         self.robot.move_pose(self.reload_point)
         self.xml_update("reload_point", self.reload_point) 
         self.robot.release_with_tool()
+        return True
 
-        # Log success
-        end_time = time.time()
-        execution_time = end_time - start_time
-        self.service_logs("Put Back Piece", True, execution_time)
-
-        # Update robot state to Idle after operation
-        self.robot_state_update(self.ned_aas_file, "Idle")
-
-    def pick_my_thing(self, shape_exp, color_exp, number):
+    def expected_object(self, shape_exp, color_exp):
+        # pyniryo shape and color of the piece named in an arch file
         if shape_exp == "Square":
             shape_expected = ObjectShape.SQUARE
         else:
@@ -432,395 +560,120 @@ class ChaikNiRyo:
             color_expected = ObjectColor.GREEN
         else:
             color_expected = ObjectColor.BLUE
+        return shape_expected, color_expected
 
-        start_time = time.time()
-
-        # Update robot state to Active before operation
-        self.robot_state_update(self.ned_aas_file, "Active")
-
-        # Check service availability
-        if "Error" in self.service_query(self.ned_aas_file, "ColorAndShapeDetection"):
-            print("Service 'ColorAndShapeDetection' not available in Niryo AAS.")
-            self.robot_state_update(self.ned_aas_file, "Idle")
-            return 0
-
-        # Moving to observation point
+    def pick_my_thing(self, shape_exp, color_exp, number):
+        return self.run_service("pick_my_thing", shape_exp, color_exp, number)
+
+    def pick_expected(self, shape_exp, color_exp, number):
+        # Driver part of pick_my_thing: places the expected piece on the arch slot number, or
+        # puts back the piece in view
+        shape_expected, color_expected = self.expected_object(shape_exp, color_exp)
+        picked = self.detect_and_pick(shape_expected, color_expected)
+        if picked:
+            self.place_on_arch(number)
+            return True
+        if picked is None:
+            print("No piece in the workspace")
+        else:
+            print("Not the good piece")
+            self.put_back_piece()
+        return False
+
+    def detect_and_pick(self, shape_expected, color_expected):
+        # Step of pick_expected, from the observation point: returns True when the expected
+        # piece is picked, False when another piece is picked (to be put back), None when the
+        # workspace is empty. The piece picked is the one detected, at the detected position:
+        # one image per pick.
+        self.inventory.stale = True
         print("Moving to observation point...")
         self.robot.move_pose(self.observe_point)
         self.xml_update("observe_point", self.observe_point)
-        obj_found, pos_array, shape, color = self.robot.detect_object(self.wp_name,
+        obj_found, rel_pose, shape, color = self.robot.detect_object(self.wp_name,
             shape=shape_expected,
             color=color_expected)
         print("Object found:", obj_found)
-        self.vpick()
-        if shape == shape_expected and color == color_expected:
+        if obj_found and shape == shape_expected and color == color_expected:
             print("We have what we want")
-            self.neutral()
-            self.robot.move_pose(self.arches_points[number])
-            self.xml_update("Build_point_" + str(number), self.arches_points[number])
-            self.robot.release_with_tool()
-
-            # Log success
-            end_time = time.time()
-            execution_time = end_time - start_time
-            self.service_logs("Pick and Place", True, execution_time)
-
-            # Update robot state to Idle after operation
-            self.robot_state_update(self.ned_aas_file, "Idle")
-            return 1
+            self.pick_detected(rel_pose)
+            return True
+        # Not the expected piece: clear the workspace of the piece in view
+        obj_found, rel_pose, shape, color = self.robot.detect_object(self.wp_name,
+            shape=ObjectShape.ANY,
+            color=ObjectColor.ANY)
+        if not obj_found:
+            return None
+        print(f"Picking the {color} {shape} piece to put it back")
+        self.pick_detected(rel_pose)
+        return False
+
+    def pick_detected(self, rel_pose):
+        # Picks the object found by detect_object() at its position relative to the workspace
+        # (x_rel, y_rel, yaw_rel), without a new acquisition as vision_pick() would make
+        if hasattr(rel_pose, "yaw"):
+            x_rel, y_rel, yaw_rel = rel_pose.x, rel_pose.y, rel_pose.yaw
         else:
-            print("Not the good piece")
-            self.put_back_piece()
-            
-            # Log failure
-            self.service_logs("Pick and Place", False, 0.0)
-
-            # Update robot state to Idle after operation
-            self.robot_state_update(self.ned_aas_file, "Idle")
-            return 0
-
-    async def check_pressure(self):
-        pressure = await get_pressure()
-        print(f"Pressure: {pressure}")
-        threshold_value = 0.5  # Replace with an appropriate threshold for object detection
-        return pressure > threshold_value
-
-###################################################################################################################################################################
-    """ DECLARATIONS OF AAS SERVICE COMPOSITION INTERFACES FUNCTIONS """
-###################################################################################################################################################################
-
-
-    def service_query(self, file_path, service_name):
-        """
-        The Service Query Interface facilitates the retrieval of data from the AAS.
-        It allows clients to query the Services submodel and obtain the necessary information,
-        for instance, the availability and parameters of services, before performing tasks.
-
-        For example, before the execution of a pick operation by the robot, the Control App
-        will query the AAS to check if the concerned service exists in its registry and to
-        obtain information about its input, output, driver function, and effector.
-        If the service is not found, an error will be returned. The process might continue
-        executing in case it was a mistake on the AAS side.
-        """
-        try:
-            # Parse the XML file with namespace handling
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            
-            # Define the namespaces
-            ns = {'aas': 'https://admin-shell.io/aas/3/0'}
-            
-            # Debug: Print root element
-            print(f"Root element: {root.tag}")
-            
-            # Find the 'Services' element using the namespace
-            services = root.find(".//aas:submodelElementCollection[aas:idShort='Services']/aas:value", ns)
-            
-            # Debug: Print if services element is found
-            if services is not None:
-                print("Found 'Services' element")
-            else:
-                print("Did not find 'Services' element")
-                return "Error: 'Services' element not found."
-            
-            # Iterate through each service in the services list
-            for service in services.findall("aas:submodelElementCollection", ns):
-                id_short = service.find("aas:idShort", ns)
-                # Debug: Print each service idShort
-                if id_short is not None:
-                    print(f"Found service with idShort: {id_short.text}")
-                    
-                if id_short is not None and id_short.text == service_name:
-                    # Find the DriverFunction property within the service
-                    driver_function = service.find(".//aas:property[aas:idShort='DriverFunction']/aas:value", ns)
-                    input_param = service.find(".//aas:property[aas:idShort='Input']/aas:value", ns)
-                    output_param = service.find(".//aas:property[aas:idShort='Output']/aas:value", ns)
-                    effector = service.find(".//aas:property[aas:idShort='Effector']/aas:value", ns)
-                    
-                    if driver_function is not None:
-                        driver_function_text = driver_function.text
-                    else:
-                        driver_function_text = "Not specified"
-                    
-                    if input_param is not None:
-                        input_param_text = input_param.text
-                    else:
-                        input_param_text = "Not specified"
-                    
-                    if output_param is not None:
-                        output_param_text = output_param.text
-                    else:
-                        output_param_text = "Not specified"
-                    
-                    if effector is not None:
-                        effector_text = effector.text
-                    else:
-                        effector_text = "Not specified"
-                    
-                    result = (
-                        f"The '{service_name}' service is available with the following details:\n"
-                        f"Driver Function: {driver_function_text}\n"
-                        f"Input: {input_param_text}\n"
-                        f"Output: {output_param_text}\n"
-                        f"Effector: {effector_text}"
-                    )
-                    print(result)
-                    return result
-            
-            error_message = f"Error: The '{service_name}' service is not available."
-            print(error_message)
-            return error_message
-        
-        except ET.ParseError as e:
-            error_message = f"Error parsing XML file: {e}"
-            print(error_message)
-            return error_message
-        except Exception as e:
-            error_message = f"An error occurred: {e}"
-            print(error_message)
-            return error_message
-
-
-
-
-############################################################################################################################################
-
-    def service_logs(self, service_name, success, execution_time):
-        """
-        The Service Logs Interface is responsible for logging and monitoring the activities
-        and performance of various services and recording them in a logfile. This is achieved
-        through the function 'service_logs()'.
-        
-        When a service is called, its status and execution time are appended to the logfile
-        'service metrics.txt' for analysis of our production chain performance and improvement.
-        """
-        # Determine the status of the service based on the success parameter
-        status = "SUCCESS" if success else "FAILURE"
-        
-        # Log performance metrics to a text file
-        with open(self.metrics_file, 'a') as f:
-            f.write(f"Service: {service_name}, Status: {status}, Execution Time: {execution_time:.2f} seconds\n")
-        
-        # Print log entry (optional, for console output)
-        print(f"Service '{service_name}' executed with {status}. Execution time: {execution_time:.2f} seconds.")
-
-
-############################################################################################################################################
-   
-    
-    def robot_state_update(file_path, state):
-        """
-        The Robot State Update Interface is designed to manage the operational states of robotic assets
-        within the AAS (Asset Administration Shell). This interface allows for dynamic modifications to
-        represent each robot's current state, such as Active, Inactive, or Maintenance. The function
-        'robot_state_update()' updates the operational state of the robot in the AAS XML file.
-        """
-        try:
-            # Parse the XML file with namespace handling
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            ns = {'aas': 'https://admin-shell.io/aas/3/0'}
-            
-            # Find the 'OperationalStates' element using the namespace
-            operational_states = root.find(".//aas:submodelElementCollection[aas:idShort='OperationalStates']/aas:value", ns)
-            if operational_states is None:
-                print("Did not find 'OperationalStates' element")
-                return "Error: 'OperationalStates' element not found."
-
-            # Valid states list
-            valid_states = ["Idle", "Active", "Error"]
-
-            if state not in valid_states:
-                print(f"Invalid state: {state}. Valid states are {valid_states}.")
-                return f"Error: Invalid state '{state}'. Valid states are {valid_states}."
-
-            # Update the state
-            state_updated = False
-            for state_property in operational_states.findall("aas:property", ns):
-                id_short = state_property.find("aas:idShort", ns)
-                if id_short is not None:
-                    state_value = state_property.find("aas:value", ns)
-                    if id_short.text == state:
-                        state_value.text = "true"
-                        state_updated = True
-                    else:
-                        if id_short.text in valid_states:
-                            state_value.text = "false"
-
-            if state_updated:
-                # Save the updated XML file
-                tree.write(file_path)
-                print(f"The robot state has been updated to '{state}'.")
-                return f"The robot state has been updated to '{state}'."
-            else:
-                print(f"The state '{state}' was not found in 'OperationalStates'.")
-                return f"Error: The state '{state}' was not found in 'OperationalStates'."
-        except ET.ParseError as e:
-            error_message = f"Error parsing XML file: {e}"
-            print(error_message)
-            return error_message
-        except Exception as e:
-            error_message = f"An error occurred: {e}"
-            print(error_message)
-            return error_message
-
-
-
-###########################################################################################################################################
-
-
-    def configure_service(file_path, service_name, input_value, output_value, driver_function, effector):
-        """
-        The Dynamic Service Configuration Interface enables updates to services within the AAS,
-        allowing users to add, remove, and modify service configurations dynamically.
-        It is crucial for maintaining an adaptive and responsive production environment.
-        
-        This function dynamically configures the specified service in the AAS XML file.
-        
-        Parameters:
-            file_path (str): The path to the AAS XML file.
-            service_name (str): The name of the service to be configured.
-            input_value (str): The input value to be set for the service.
-            output_value (str): The output value to be set for the service.
-            driver_function (str): The driver function to be set for the service.
-            effector (str): The effector value to be set for the service.
-        """
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            ns = {'aas': 'https://admin-shell.io/aas/3/0'}
-            
-            services = root.find(".//aas:submodelElementCollection[aas:idShort='Services']/aas:value", ns)
-            if services is None:
-                print("Did not find 'Services' element")
-                return
-
-            for service in services.findall("aas:submodelElementCollection", ns):
-                id_short = service.find("aas:idShort", ns)
-                if id_short is not None and id_short.text == service_name:
-                    # Update service properties
-                    service.find(".//aas:property[aas:idShort='Input']/aas:value", ns).text = input_value
-                    service.find(".//aas:property[aas:idShort='Output']/aas:value", ns).text = output_value
-                    service.find(".//aas:property[aas:idShort='DriverFunction']/aas:value", ns).text = driver_function
-                    service.find(".//aas:property[aas:idShort='Effector']/aas:value", ns).text = effector
-
-                    # Save the updated XML file
-                    tree.write(file_path)
-                    print(f"The '{service_name}' service has been configured.")
-                    return
-
-            print(f"The '{service_name}' service is not available.")
-        except ET.ParseError as e:
-            print(f"Error parsing XML file: {e}")
-        except Exception as e:
-            print(f"An error occurred: {e}")
-
-
-###########################################################################################################################################
-
-
-    def add_service(file_path, service_name, input_value, output_value, driver_function, effector):
-        """
-        The Dynamic Service Configuration Interface enables the dynamic addition of new services,
-        integrating with existing systems.
-
-        This function adds a new service to the AAS XML file.
-
-        Parameters:
-            file_path (str): The path to the AAS XML file.
-            service_name (str): The name of the new service to be added.
-            input_value (str): The input value to be set for the new service.
-            output_value (str): The output value to be set for the new service.
-            driver_function (str): The driver function to be set for the new service.
-            effector (str): The effector value to be set for the new service.
-        """
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            ns = {'aas': 'https://admin-shell.io/aas/3/0'}
-
-            services = root.find(".//aas:submodelElementCollection[aas:idShort='Services']/aas:value", ns)
-            if services is None:
-                print("Did not find 'Services' element")
-                return
-
-            new_service = ET.Element("aas:submodelElementCollection", ns)
-            id_short = ET.SubElement(new_service, "aas:idShort", ns)
-            id_short.text = service_name
-
-            input_prop = ET.SubElement(new_service, "aas:property", ns)
-            input_id = ET.SubElement(input_prop, "aas:idShort", ns)
-            input_id.text = "Input"
-            input_val = ET.SubElement(input_prop, "aas:value", ns)
-            input_val.text = input_value
-
-            output_prop = ET.SubElement(new_service, "aas:property", ns)
-            output_id = ET.SubElement(output_prop, "aas:idShort", ns)
-            output_id.text = "Output"
-            output_val = ET.SubElement(output_prop, "aas:value", ns)
-            output_val.text = output_value
-
-            driver_prop = ET.SubElement(new_service, "aas:property", ns)
-            driver_id = ET.SubElement(driver_prop, "aas:idShort", ns)
-            driver_id.text = "DriverFunction"
-            driver_val = ET.SubElement(driver_prop, "aas:value", ns)
-            driver_val.text = driver_function
-
-            effector_prop = ET.SubElement(new_service, "aas:property", ns)
-            effector_id = ET.SubElement(effector_prop, "aas:idShort", ns)
-            effector_id.text = "Effector"
-            effector_val = ET.SubElement(effector_prop, "aas:value", ns)
-            effector_val.text = effector
-
-            services.append(new_service)
-
-            # Save the updated XML file
-            tree.write(file_path)
-            print(f"The '{service_name}' service has been added.")
-        except ET.ParseError as e:
-            print(f"Error parsing XML file: {e}")
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            
-
-###########################################################################################################################################
-
-
-    def remove_service(file_path, service_name):
-        """
-        The Dynamic Service Configuration Interface allows for the removal of unnecessary services
-        to optimize performance and resource utilization.
-
-        This function removes a specified service from the AAS XML file.
-
-        Parameters:
-            file_path (str): The path to the AAS XML file.
-            service_name (str): The name of the service to be removed.
-        """
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            ns = {'aas': 'https://admin-shell.io/aas/3/0'}
-
-            services = root.find(".//aas:submodelElementCollection[aas:idShort='Services']/aas:value", ns)
-            if services is None:
-                print("Did not find 'Services' element")
-                return
-
-            for service in services.findall("aas:submodelElementCollection", ns):
-                id_short = service.find("aas:idShort", ns)
-                if id_short is not None and id_short.text == service_name:
-                    services.remove(service)
-                    tree.write(file_path)
-                    print(f"The '{service_name}' service has been removed.")
-                    return
-
-            print(f"The '{service_name}' service is not available.")
-        except ET.ParseError as e:
-            print(f"Error parsing XML file: {e}")
-        except Exception as e:
-            print(f"An error occurred: {e}")
-
+            x_rel, y_rel, yaw_rel = rel_pose[:3]
+        target = self.robot.get_target_pose_from_rel(self.wp_name, VISION_HEIGHT_OFFSET, x_rel, y_rel, yaw_rel)
+        self.robot.pick_from_pose(target)
+
+    def place_on_arch(self, number):
+        # Step of pick_expected and place_needed, once the piece is picked: straight to the
+        # arch, the observe pose is only needed to look for another piece
+        print("Moving to the arch...")
+        self.move_through(self.arches_points[number])
+        self.xml_update("Build_point_" + str(number), self.arches_points[number])
+        self.robot.release_with_tool()
 
-#####################################################################################################################################################
-        
+    def pick_for_plan(self, plan):
+        # Arch building from the workspace inventory. plan maps the arch slots still to build
+        # (numbers of arches_points) to the shape and color of their piece, as in the arch file.
+        # Places a piece in view on a slot that needs it and removes the slot from plan; when no
+        # piece in view is needed, puts them back and returns False: a new piece must be conveyed.
+        return self.run_service("pick_for_plan", plan)
+
+    def place_needed(self, plan):
+        # Driver part of pick_for_plan. None when no piece in view is needed (e.g. the empty
+        # workspace before the first conveyance): no pick and place was attempted, the service
+        # metrics get no failure
+        number, piece = self.match_plan(plan)
+        if piece is None:
+            print("No piece in the workspace is needed by the arch")
+            self.clear_workspace()
+            return None
+        print(f"Picking {piece} for slot {number}")
+        self.pick_piece(piece)
+        self.place_on_arch(number)
+        del plan[number]
+        return True
+
+    def match_plan(self, plan):
+        # Step of place_needed: (slot, piece) for the first slot of plan with a matching
+        # piece in the inventory, scanned again if a piece was conveyed since; (None, None) if none
+        if self.inventory.stale:
+            self.scan_workspace()
+        for number in sorted(plan):
+            piece = self.inventory.find(*self.expected_object(*plan[number]))
+            if piece is not None:
+                return number, piece
+        return None, None
+
+    def pick_piece(self, piece):
+        # Picks a piece of the inventory, which no longer lists it
+        self.pick_detected(piece.rel_pose)
+        self.inventory.remove(piece)
+
+    def clear_workspace(self):
+        # Puts back every piece of the inventory
+        for piece in list(self.inventory.pieces):
+            self.pick_piece(piece)
+            self.put_back()
+
+    def check_pressure(self, since=None):
+        # Grip check read in the calling thread (see GripCheck); without since, from the latest
+        # pressure
+        if since is None:
+            pressure = pressure_monitor.read()
+            print(f"Pressure: {pressure}")
+            return pressure > GRIP_PRESSURE_THRESHOLD
+        return GripCheck(since).read()
@@ -1,7 +1,15 @@
 import asyncio
-from asyncua import ua, Server
+from collections import deque
+import hashlib
+import json
+from asyncua import ua, uamethod, Server
 import logging
 import os
+import time
+
+from aas_repository import AASError, aas_cache
+from ring_history import RingBufferHistory
+from robot_jobs import ROBOT_SERVICES, RobotJobQueue, controller_factory
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('asyncua')
@@ -9,15 +17,256 @@ logger = logging.getLogger('asyncua')
 OPC_UA_URL = "opc.tcp://172.20.10.3:4840/opcua/"
 NAMESPACE = "mynamespace"
 PRESSURE_VALUE = 101.3
+# Pressure samples kept in memory for HistoryRead, and optional file they are spilled to
+PRESSURE_HISTORY_SIZE = 100000
+PRESSURE_HISTORY_FILE = None  # e.g. os.path.expanduser("~/Desktop/pressure_history.bin")
 SERVER_FILE_DIRECTORY = os.path.expanduser("~/Desktop/")
 AASX_FILES = {
     "NiryoNed2AAS.aasx": os.path.join(SERVER_FILE_DIRECTORY, "NiryoNed2AAS.aasx"),
     "WlkataMirobotAAS.aasx": os.path.join(SERVER_FILE_DIRECTORY, "WlkataMirobotAAS.aasx")
 }
+# Each file is published with the SHA-256 of its content in the variable '<file name>.sha256'
+HASH_SUFFIX = ".sha256"
+# Largest chunk returned by one call to the Read method of the file objects
+MAX_CHUNK_SIZE = 64 * 1024
+# OPC UA FileType open mode bits
+FILE_MODE_READ = 0x1
+# File handles unused for this long (in seconds) are closed, for the clients that disconnect or
+# fail during a transfer without calling Close
+FILE_HANDLE_TIMEOUT = 60.0
+# Finished jobs kept in the address space, per robot
+MAX_JOB_HISTORY = 50
+
+
+class FileTypeHandler:
+    """
+    Serves one file through the methods of an OPC UA FileType object (Open, Read, GetPosition,
+    SetPosition, Close), read-only. Each Read call reads at most MAX_CHUNK_SIZE bytes from disk,
+    so the file is never held in memory as a whole. A handle left open longer than
+    handle_timeout since its last use is closed by expire().
+    """
+    def __init__(self, file_path, max_chunk_size=MAX_CHUNK_SIZE, handle_timeout=FILE_HANDLE_TIMEOUT):
+        self.path = file_path
+        self.max_chunk_size = max_chunk_size
+        self.handle_timeout = handle_timeout
+        # handle -> [file, time.monotonic() of its last use]
+        self._handles = {}
+        self._next_handle = 1
+
+    async def bind(self, file_object, server):
+        # Size of the file and read-only flags, then the method callbacks
+        await (await file_object.get_child("0:Size")).write_value(
+            ua.Variant(os.path.getsize(self.path), ua.VariantType.UInt64))
+        for name in ("Writable", "UserWritable"):
+            await (await file_object.get_child(f"0:{name}")).write_value(False)
+        for name, callback in (("Open", self.open), ("Read", self.read), ("Close", self.close),
+                               ("GetPosition", self.get_position), ("SetPosition", self.set_position)):
+            server.link_method(await file_object.get_child(f"0:{name}"), uamethod(callback))
+
+    def _file(self, handle):
+        entry = self._handles.get(handle)
+        if entry is None:
+            raise ua.UaStatusCodeError(ua.StatusCodes.BadInvalidArgument)
+        entry[1] = time.monotonic()
+        return entry[0]
+
+    def expire(self):
+        """
+        Closes the handles unused for more than handle_timeout. Called periodically by the server.
+        """
+        deadline = time.monotonic() - self.handle_timeout
+        for handle in [handle for handle, (_, used) in self._handles.items() if used < deadline]:
+            f, _ = self._handles.pop(handle)
+            f.close()
+            logger.info(f"Closed the idle handle {handle} of {os.path.basename(self.path)}")
+
+    def open(self, parent, mode):
+        if mode != FILE_MODE_READ:
+            raise ua.UaStatusCodeError(ua.StatusCodes.BadNotWritable)
+        handle = self._next_handle
+        self._next_handle += 1
+        self._handles[handle] = [open(self.path, 'rb'), time.monotonic()]
+        return ua.Variant(handle, ua.VariantType.UInt32)
+
+    def read(self, parent, handle, length):
+        data = self._file(handle).read(max(0, min(length, self.max_chunk_size)))
+        return ua.Variant(data, ua.VariantType.ByteString)
+
+    def get_position(self, parent, handle):
+        return ua.Variant(self._file(handle).tell(), ua.VariantType.UInt64)
+
+    def set_position(self, parent, handle, position):
+        self._file(handle).seek(position)
+
+    def close(self, parent, handle):
+        self._file(handle).close()
+        del self._handles[handle]
+
+    def close_all(self):
+        for f, _ in self._handles.values():
+            f.close()
+        self._handles.clear()
+
+
+class StateFlagsHandler:
+    """
+    Keeps the Boolean state flags of a shell in line with its 'OperationalState' variable,
+    which the controllers write (internal data change subscription).
+    """
+    def __init__(self):
+        self._flags = {}
+        # Updates in progress, referenced until they are done (the loop only keeps weak references)
+        self._tasks = set()
+
+    def watch(self, state_node, flags):
+        # flags: state name -> Boolean variable
+        self._flags[state_node.nodeid] = flags
+
+    def datachange_notification(self, node, val, data):
+        task = asyncio.get_running_loop().create_task(self._update(self._flags[node.nodeid], val))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update(self, flags, state):
+        for name, flag in flags.items():
+            await flag.write_value(name == state)
+
+
+class NodeStatePublisher:
+    """
+    State publisher of the controllers run by the job queues of the server (see
+    AASServiceInterface.state_publisher): writes the 'OperationalState' variable of their shell
+    straight into the address space, without an OPC UA session. publish() is called from the
+    controller's thread.
+    """
+    def __init__(self, loop, state_node):
+        self.loop = loop
+        self.state_node = state_node
+        self._writes = set()
+
+    def publish(self, file_path, state):
+        future = asyncio.run_coroutine_threadsafe(
+            self.state_node.write_value(ua.Variant(state, ua.VariantType.String)), self.loop)
+        self._writes.add(future)
+        future.add_done_callback(self._written)
+
+    def _written(self, future):
+        self._writes.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Could not publish the robot state: {future.exception()}")
+
+
+async def add_shell_nodes(parent, idx, file_name, file_path, state_handler):
+    """
+    Projects the OperationalStates and Services collections of an AAS under an object named
+    after its file ('NiryoNed2AAS'):
+        OperationalState          String, current state, written by the controllers
+        OperationalStates/<State> Boolean, true for the current state
+        Services/<Service>/<Property>  String (Input, Output, DriverFunction, Effector)
+    Returns the shell object and its 'OperationalState' variable, (None, None) if the AAS cannot
+    be read.
+    """
+    try:
+        document = aas_cache.get(file_path)
+        services = document.services or {}
+        states = document.states
+    except AASError as e:
+        logger.warning(f"No AAS nodes for {file_name}: {e}")
+        return None, None
+    shell = await parent.add_object(idx, file_name.split('.', 1)[0])
+
+    state_node = await shell.add_variable(idx, "OperationalState", ua.Variant(states.current or "", ua.VariantType.String))
+    await state_node.set_writable()
+    states_object = await shell.add_object(idx, "OperationalStates")
+    flags = {}
+    for name in states.available:
+        flags[name] = await states_object.add_variable(idx, name, ua.Variant(name == states.current, ua.VariantType.Boolean))
+    state_handler.watch(state_node, flags)
+
+    services_object = await shell.add_object(idx, "Services")
+    for name, record in services.items():
+        service = await services_object.add_object(idx, name)
+        for id_short, value in (("Input", record.input), ("Output", record.output),
+                                ("DriverFunction", record.driver_function), ("Effector", record.effector)):
+            await service.add_variable(idx, id_short, ua.Variant(value or "", ua.VariantType.String))
+    return shell, state_node
+
+
+class JobNodes:
+    """
+    OPC UA side of a RobotJobQueue: one method 'Services/Run<Service>' per mapped AAS service
+    (input: the arguments as a JSON array; output: the job id, returned at once) and the job
+    status under 'Jobs':
+        Jobs/QueueLength, Jobs/CurrentJob         UInt32
+        Jobs/<id>/Service, Status, Result, Error  String
+    Only the last MAX_JOB_HISTORY finished jobs are kept.
+    """
+    def __init__(self, server, idx, shell, robot):
+        self.server = server
+        self.idx = idx
+        self.shell = shell
+        self.robot = robot
+        self.queue = None
+        self._jobs = {}
+        self._finished = deque()
+
+    async def bind(self, mapping, state_publisher=None):
+        factory = controller_factory(mapping["controller"], mapping["setup"], state_publisher)
+        self.queue = RobotJobQueue(self.robot, factory, mapping["services"], on_change=self.job_changed)
+        services = await self.shell.get_child(f"{self.idx}:Services")
+        for service in mapping["services"]:
+            await services.add_method(self.idx, f"Run{service}", self._method(service),
+                                      [ua.VariantType.String], [ua.VariantType.UInt32])
+        self.jobs = await self.shell.add_object(self.idx, "Jobs")
+        self.queue_length = await self.jobs.add_variable(self.idx, "QueueLength", ua.Variant(0, ua.VariantType.UInt32))
+        self.current_job = await self.jobs.add_variable(self.idx, "CurrentJob", ua.Variant(0, ua.VariantType.UInt32))
+
+    def _method(self, service):
+        @uamethod
+        async def run_service(parent, arguments):
+            try:
+                args = json.loads(arguments) if arguments else []
+            except ValueError:
+                raise ua.UaStatusCodeError(ua.StatusCodes.BadInvalidArgument)
+            if not isinstance(args, list):
+                args = [args]
+            # The job nodes exist before the worker can change the job's status
+            job = self.queue.job(service, args)
+            await self._add_job(job)
+            self.queue.put(job)
+            await self.queue_length.write_value(ua.Variant(len(self.queue), ua.VariantType.UInt32))
+            return ua.Variant(job.id, ua.VariantType.UInt32)
+        return run_service
+
+    async def _add_job(self, job):
+        node = await self.jobs.add_object(self.idx, str(job.id))
+        self._jobs[job.id] = {
+            "node": node,
+            "Service": await node.add_variable(self.idx, "Service", job.service),
+            "Status": await node.add_variable(self.idx, "Status", job.status),
+            "Result": await node.add_variable(self.idx, "Result", ""),
+            "Error": await node.add_variable(self.idx, "Error", ""),
+        }
+
+    async def job_changed(self, job):
+        nodes = self._jobs[job.id]
+        await nodes["Status"].write_value(job.status)
+        await nodes["Result"].write_value("" if job.result is None else str(job.result))
+        await nodes["Error"].write_value(job.error or "")
+        await self.queue_length.write_value(ua.Variant(len(self.queue), ua.VariantType.UInt32))
+        await self.current_job.write_value(ua.Variant(job.id if job.finished is None else 0, ua.VariantType.UInt32))
+        if job.finished is not None:
+            self._finished.append(job.id)
+            while len(self._finished) > MAX_JOB_HISTORY:
+                nodes = self._jobs.pop(self._finished.popleft())
+                await self.server.delete_nodes([nodes["node"]], recursive=True)
+
 
 async def main():
     # Create server instance
     server = Server()
+    # History storage of the pressure, set before init() which initializes it
+    server.iserver.history_manager.set_storage(RingBufferHistory(PRESSURE_HISTORY_SIZE, PRESSURE_HISTORY_FILE))
     await server.init()
     server.set_endpoint(OPC_UA_URL)
     uri = NAMESPACE
@@ -33,24 +282,58 @@ async def main():
     press_var = await vPLC.add_variable(idx, "pression", PRESSURE_VALUE)
     await press_var.set_writable()
 
-    # Add file nodes to the vPLC object
+    # Add file objects (OPC UA FileType, read in chunks by the clients) to the vPLC object
+    file_handlers = []
+    for file_name, file_path in AASX_FILES.items():
+        file_object = await vPLC.add_object(idx, file_name, objecttype=ua.ObjectIds.FileType)
+        file_handler = FileTypeHandler(file_path)
+        await file_handler.bind(file_object, server)
+        file_handlers.append(file_handler)
+        await vPLC.add_variable(idx, file_name + HASH_SUFFIX, ua.Variant(file_hash(file_path), ua.VariantType.String))
+
+    # Add the live view of each shell (operational state and service registry)
+    state_handler = StateFlagsHandler()
+    state_nodes = []
+    job_nodes = []
     for file_name, file_path in AASX_FILES.items():
-        file_content = read_file(file_path)
-        file_node = await vPLC.add_variable(idx, file_name, ua.Variant(file_content, ua.VariantType.ByteString))
-        await file_node.set_writable()
+        shell, state_node = await add_shell_nodes(vPLC, idx, file_name, file_path, state_handler)
+        if shell is None:
+            continue
+        state_nodes.append(state_node)
+        # Service methods executed by the robot's job queue
+        robot = file_name.split('.', 1)[0]
+        if robot in ROBOT_SERVICES:
+            jobs = JobNodes(server, idx, shell, robot)
+            await jobs.bind(ROBOT_SERVICES[robot], NodeStatePublisher(asyncio.get_running_loop(), state_node))
+            job_nodes.append(jobs)
 
     # Start the server
     async with server:
         logger.info(f"Server started at {OPC_UA_URL}")
-        while True:
-            await asyncio.sleep(1)
+        await server.historize_node_data_change(press_var, period=None, count=PRESSURE_HISTORY_SIZE)
+        if state_nodes:
+            subscription = await server.create_subscription(100, state_handler)
+            await subscription.subscribe_data_change(state_nodes)
+        # Job queue workers (references kept for the tasks to stay alive)
+        workers = [asyncio.create_task(jobs.queue.run()) for jobs in job_nodes]
+        try:
+            while True:
+                await asyncio.sleep(1)
+                for file_handler in file_handlers:
+                    file_handler.expire()
+        finally:
+            for file_handler in file_handlers:
+                file_handler.close_all()
 
-def read_file(file_path):
+def file_hash(file_path):
     """
-    Reads the file content and returns it as bytes.
+    Returns the SHA-256 of the file content, read in chunks.
     """
+    digest = hashlib.sha256()
     with open(file_path, 'rb') as f:
-        return f.read()
+        for chunk in iter(lambda: f.read(MAX_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 if __name__ == "__main__":
     asyncio.run(main())
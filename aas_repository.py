@@ -0,0 +1,1093 @@
+"""
+Shared access layer for the AAS (Asset Administration Shell) XML files of the robotic chain.
+
+Every AAS file is parsed once and kept in memory, keyed by its resolved path. A cached document
+is parsed again only when the file's modification time or size changes on disk, so the Service
+Query, Robot State Update and Dynamic Service Configuration interfaces of ChaikNiRyo and
+ChaikWLKATA no longer run ET.parse on the whole environment for every call.
+
+Operational state transitions are applied to the in-memory document immediately and written
+behind: consecutive flips are coalesced and the file is rewritten at most once per
+STATE_PERSIST_DELAY seconds (and on interpreter shutdown), through an atomic temp-file-and-rename.
+
+Changes to the 'Services' collection go through AASTransaction: add, modify and remove operations
+are staged as records, validated against a working copy of the tree and committed together in a
+single atomic write, or discarded as a whole on error.
+
+In journal mode (JOURNAL_MODE) mutations are not written as whole documents: they are appended
+as small JSON records to a '<file>.journal' sidecar, and the XML is rebuilt from the journal
+(compaction) once the journal exceeds JOURNAL_MAX_BYTES or JOURNAL_MAX_AGE seconds. Readers always
+see the XML with the journal replayed on top of it, and the journal keeps a timestamped trail of
+every state transition until it is compacted.
+
+Documents are parsed lazily: a service query on a document that has not been fully parsed yet is
+answered from a streaming pass (iter_elements) that only keeps the 'Services' collection, so large
+multi-asset environments are never loaded whole just to look up a service.
+
+An AAS file can also be an AASX package (path ending in '.aasx'): the environment is then parsed
+straight from the archive (see aasx_package.py) and written back into it, the other parts of the
+package being copied without decompressing them.
+
+The service index and the operational states model of each document are also saved in a compact
+binary snapshot ('<file>.snapshot', marshal format) validated by a hash of the file content. A
+process starting on an unchanged AAS file loads them from the snapshot instead of parsing XML.
+
+Writers in several threads or processes are coordinated per file: every write happens under an
+exclusive FileLock ('<file>.lock', fcntl.flock), and the document carries a version counter (the
+'DocumentVersion' extension of its shell, and the 'v' of each journal record). A writer whose
+in-memory document is older than the file on disk, because the file has another version or was
+modified or replaced since it was loaded (its stamp changed, as when client.py downloads a new
+package), does not overwrite it: it reloads the file, replays its own operation records on top of
+it and writes the result.
+"""
+
+import atexit
+import copy
+import hashlib
+import json
+import marshal
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (Windows) FileLock only coordinates the threads of the process
+    fcntl = None
+
+from aasx_package import AASXError, AASXPackage, replace_spec
+
+# Namespace of the AAS V3 XML serialization
+AAS_NS = 'https://admin-shell.io/aas/3/0'
+ns = {'aas': AAS_NS}
+# Serialize with the AAS namespace as default namespace instead of 'ns0:' prefixes
+ET.register_namespace('', AAS_NS)
+
+# States of the 'OperationalStates' collection a robot can be set to
+VALID_STATES = ["Idle", "Active", "Error"]
+# Maximum time (in seconds) an operational state change stays in memory before being written
+STATE_PERSIST_DELAY = 2.0
+
+# Append mutations to a journal next to the AAS file instead of rewriting the whole document
+JOURNAL_MODE = False
+JOURNAL_SUFFIX = '.journal'
+# Compaction thresholds: journal size (in bytes) and age of its first record (in seconds)
+JOURNAL_MAX_BYTES = 64 * 1024
+JOURNAL_MAX_AGE = 600.0
+
+# Binary snapshot of the service index and operational states, stored next to the AAS file
+SNAPSHOT_SUFFIX = '.snapshot'
+_SNAPSHOT_FORMAT = 1
+
+# Clark-notation tags used when walking the tree without XPath
+_ID_SHORT = f'{{{AAS_NS}}}idShort'
+_VALUE = f'{{{AAS_NS}}}value'
+_PROPERTY = f'{{{AAS_NS}}}property'
+_COLLECTION = f'{{{AAS_NS}}}submodelElementCollection'
+_SUBMODEL = f'{{{AAS_NS}}}submodel'
+_SHELL = f'{{{AAS_NS}}}assetAdministrationShell'
+_EXTENSION = f'{{{AAS_NS}}}extension'
+_NAME = f'{{{AAS_NS}}}name'
+
+# Extension of the (first) shell holding the version counter of the document
+VERSION_EXTENSION = 'DocumentVersion'
+LOCK_SUFFIX = '.lock'
+
+# Entry of the service index. Fields the AAS does not specify are None.
+ServiceRecord = namedtuple('ServiceRecord', ['name', 'driver_function', 'input', 'output', 'effector'])
+# Properties describing a service, in the order they are written for a new service
+SERVICE_PROPERTIES = ['Input', 'Output', 'DriverFunction', 'Effector']
+
+
+class AASError(Exception):
+    """
+    Base class of the errors raised by the AAS access layer.
+    """
+
+
+class ServiceNotAvailable(AASError):
+    """
+    Raised when a service is not registered in the 'Services' collection of the AAS.
+    """
+
+
+def resolve_path(file_path):
+    """
+    Returns the canonical path used as cache key ('~' expanded, symlinks resolved).
+    """
+    return os.path.realpath(os.path.expanduser(file_path))
+
+
+def _file_stamp(path):
+    # The inode changes whenever the file is replaced by a rename, even within the resolution of
+    # the modification time and with the same size
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def journal_path(path):
+    return path + JOURNAL_SUFFIX
+
+
+def _document_stamp(path):
+    """
+    Stamp of what a reader of path sees: the XML file and its journal (None when there is none).
+    """
+    try:
+        journal_stamp = _file_stamp(journal_path(path))
+    except FileNotFoundError:
+        journal_stamp = None
+    return (_file_stamp(path), journal_stamp)
+
+
+def _read_journal(path, base_stamp):
+    """
+    Returns (header, records) of the journal of path. The journal is ignored (None, []) when it
+    does not exist or was started on another version of the XML file, i.e. it has already been
+    compacted into it. A torn last line, left by a crash during an append, is dropped.
+    """
+    try:
+        with open(journal_path(path), 'rb') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return None, []
+    try:
+        header = json.loads(lines[0])
+    except (IndexError, ValueError):
+        return None, []
+    if tuple(header.get('base', ())) != tuple(base_stamp):
+        return None, []
+    records = []
+    for line in lines[1:]:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            break
+    return header, records
+
+
+def _journal_line(record):
+    return json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def is_aasx(path):
+    return path.lower().endswith('.aasx')
+
+
+@contextmanager
+def open_document(path):
+    """
+    Opens the XML environment of an AAS file for binary reading, out of the archive for AASX
+    packages.
+    """
+    if is_aasx(path):
+        with AASXPackage(path) as package, package.open_spec() as f:
+            yield f
+    else:
+        with open(path, 'rb') as f:
+            yield f
+
+
+def parse_document(path):
+    with open_document(path) as f:
+        return ET.parse(f)
+
+
+@contextmanager
+def _aas_errors():
+    # Turns the parsing and I/O errors of the layer into AASError for the robot controllers
+    try:
+        yield
+    except ET.ParseError as e:
+        raise AASError(f"Error parsing XML file: {e}") from e
+    except (OSError, zipfile.BadZipFile, AASXError) as e:
+        raise AASError(f"Error accessing AAS file: {e}") from e
+
+
+def _atomic_write(tree, path):
+    """
+    Writes tree to a temporary file next to path and renames it over path, so a crash or power
+    loss leaves either the old or the new document on disk, never a truncated one. AASX packages
+    are rebuilt with the new environment part the same way.
+    """
+    data = ET.tostring(tree.getroot(), encoding='utf-8', xml_declaration=True)
+    if is_aasx(path):
+        replace_spec(path, data)
+    else:
+        _atomic_write_bytes(path, data)
+
+
+def _atomic_write_bytes(path, data):
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class FileLock:
+    """
+    Exclusive, re-entrant lock on an AAS file, for the threads of this process (one RLock per
+    file) and for other processes (fcntl.flock on '<file>.lock'):
+
+        with FileLock(path):
+            ...read the version on disk, write...
+    """
+    _states = {}
+    _states_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        with FileLock._states_lock:
+            self._state = FileLock._states.setdefault(path, {'lock': threading.RLock(), 'depth': 0, 'file': None})
+
+    def __enter__(self):
+        state = self._state
+        state['lock'].acquire()
+        if state['depth'] == 0:
+            try:
+                f = open(self.path + LOCK_SUFFIX, 'a+b')
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                except BaseException:
+                    f.close()
+                    raise
+            except BaseException:
+                state['lock'].release()
+                raise
+            state['file'] = f
+        state['depth'] += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        state = self._state
+        state['depth'] -= 1
+        if state['depth'] == 0:
+            f, state['file'] = state['file'], None
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            f.close()
+        state['lock'].release()
+        return False
+
+
+def _version_extension(root, create=False):
+    shell = root.find('aas:assetAdministrationShells/aas:assetAdministrationShell', ns)
+    if shell is None:
+        return None
+    for extension in shell.findall('aas:extensions/aas:extension', ns):
+        if extension.findtext(_NAME) == VERSION_EXTENSION:
+            return extension
+    if not create:
+        return None
+    extensions = shell.find('aas:extensions', ns)
+    if extensions is None:
+        # 'extensions' comes first in the content of a shell
+        extensions = ET.Element(f'{{{AAS_NS}}}extensions')
+        extensions.tail = shell.text
+        shell.insert(0, extensions)
+    extension = ET.SubElement(extensions, _EXTENSION)
+    ET.SubElement(extension, _NAME).text = VERSION_EXTENSION
+    ET.SubElement(extension, f'{{{AAS_NS}}}valueType').text = 'xs:integer'
+    ET.SubElement(extension, _VALUE).text = '0'
+    return extension
+
+
+def tree_version(root):
+    extension = _version_extension(root)
+    return int(extension.findtext(_VALUE) or 0) if extension is not None else 0
+
+
+def set_tree_version(root, version):
+    extension = _version_extension(root, create=True)
+    if extension is not None:
+        extension.find(_VALUE).text = str(version)
+
+
+def stream_version(path):
+    """
+    Version counter of the AAS file, read with a streaming parse that stops at the end of the
+    first shell (the top of the file).
+    """
+    with open_document(path) as f:
+        for _, element in ET.iterparse(f):
+            if element.tag == _EXTENSION and element.findtext(_NAME) == VERSION_EXTENSION:
+                return int(element.findtext(_VALUE) or 0)
+            if element.tag == _SHELL:
+                return 0
+    return 0
+
+
+def _journal_version(records):
+    for record in reversed(records):
+        if 'v' in record:
+            return record['v']
+    return None
+
+
+def read_version(path):
+    """
+    Version of the AAS file on disk: the version of its last journal record, else the version
+    counter of the XML.
+    """
+    _, records = _read_journal(path, _file_stamp(path))
+    version = _journal_version(records)
+    return version if version is not None else stream_version(path)
+
+
+def snapshot_path(path):
+    return path + SNAPSHOT_SUFFIX
+
+
+def content_hash(path):
+    """
+    SHA-1 of what a reader of path sees: the AAS file followed by its journal, if any.
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha.update(chunk)
+    try:
+        with open(journal_path(path), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                sha.update(chunk)
+    except FileNotFoundError:
+        pass
+    return sha.hexdigest()
+
+
+def read_snapshot(path, digest):
+    """
+    Returns (service index, OperationalStates or None) from the snapshot of path, or None when
+    there is no snapshot or it was taken from another content than digest.
+    """
+    try:
+        with open(snapshot_path(path), 'rb') as f:
+            data = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(data, dict) or data.get('format') != _SNAPSHOT_FORMAT or data.get('hash') != digest:
+        return None
+    services = {record[0]: ServiceRecord(*record) for record in data['services']}
+    states = OperationalStates(*data['states']) if data['states'] is not None else None
+    return services, states
+
+
+def write_snapshot(path, digest, services, states):
+    """
+    Saves the service index and operational states of the content identified by digest. A
+    snapshot that cannot be written (read-only directory...) is simply skipped.
+    """
+    data = {
+        'format': _SNAPSHOT_FORMAT,
+        'hash': digest,
+        'services': [tuple(record) for record in services.values()],
+        'states': (states.available, states.current) if states is not None else None,
+    }
+    try:
+        _atomic_write_bytes(snapshot_path(path), marshal.dumps(data))
+    except OSError:
+        pass
+
+
+def iter_elements(source, id_shorts):
+    """
+    Streams the AAS XML source (path or binary file object) with iterparse and yields
+    (idShort, element) for every submodel or submodelElementCollection whose idShort is in
+    id_shorts, as soon as the element is complete.
+
+    Everything outside the requested elements is cleared and detached from the tree while
+    parsing, so memory stays bounded by the largest requested element whatever the size of the
+    environment. Requested elements nested in another requested element are yielded as part of
+    it only.
+    """
+    wanted = set(id_shorts)
+    # Open elements: [element, kept, yielded], 'kept' when inside (or being) a requested element
+    stack = []
+    for event, element in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append([element, bool(stack) and stack[-1][1], False])
+            continue
+
+        _, kept, yielded = stack.pop()
+        parent = stack[-1] if stack else None
+
+        # The idShort comes first in a submodel/collection: decide whether to keep its parent
+        if (element.tag == _ID_SHORT and parent is not None and not parent[1]
+                and parent[0].tag in (_SUBMODEL, _COLLECTION) and element.text in wanted):
+            parent[1] = parent[2] = True
+            continue
+
+        if yielded:
+            if parent is not None:
+                parent[0].remove(element)
+            yield element.findtext(_ID_SHORT), element
+        elif not kept:
+            element.clear()
+            if parent is not None:
+                parent[0].remove(element)
+
+
+def load_elements(file_path, id_shorts):
+    """
+    Returns a dict idShort -> element of the requested submodels and collections of the AAS file,
+    extracted with a streaming parse (see iter_elements). The first occurrence of an idShort wins.
+    """
+    elements = {}
+    with open_document(resolve_path(file_path)) as f:
+        for id_short, element in iter_elements(f, id_shorts):
+            elements.setdefault(id_short, element)
+    return elements
+
+
+class AASDocument:
+    """
+    An AAS file (with its journal replayed) together with the stamps of the files it was read
+    from and the hash of their content ('digest', None once the document has been written).
+
+    The tree is parsed on first use only. The service index and the operational states model are
+    loaded together, from the binary snapshot when it matches the digest, else from the tree or
+    from a streaming pass over the 'Services' and 'OperationalStates' collections.
+    'dirty' is set while the records in 'pending' (state changes) are not on disk yet; 'journal'
+    is the header of the journal the document currently extends, if any; 'version' is the version
+    of the file the document was loaded from or last written as.
+    """
+    def __init__(self, path, stamp, journal=None, tree=None, digest=None, version=0):
+        self.path = path
+        self.stamp = stamp
+        self.journal = journal
+        self.digest = digest
+        self.version = version
+        self.dirty = False
+        self.pending = []
+        self._tree = tree
+        self._lock = threading.RLock()
+        self._models_loaded = False
+        self._services = None
+        self._states = None
+
+    @property
+    def tree(self):
+        """
+        Parsed ElementTree of the document, loaded on first access. A states model loaded
+        beforehand is bound to it, so pending transitions are reflected in the tree.
+        """
+        if self._tree is None:
+            with self._lock:
+                if self._tree is None:
+                    tree = parse_document(self.path)
+                    if self._states is not None:
+                        self._states.bind(tree.getroot())
+                    self._tree = tree
+        return self._tree
+
+    def _load_models(self):
+        with self._lock:
+            if self._models_loaded:
+                return
+            snapshot = read_snapshot(self.path, self.digest) if self.digest else None
+            if snapshot is not None:
+                self._services, self._states = snapshot
+            elif self._tree is not None:
+                root = self._tree.getroot()
+                self._services = build_service_index(root)
+                self._states = OperationalStates.from_root(root)
+            else:
+                self._services, self._states = stream_models(self.path)
+            if self._states is not None and self._tree is not None:
+                self._states.bind(self._tree.getroot())
+            if snapshot is None and self.digest and not self.dirty:
+                write_snapshot(self.path, self.digest, self._services, self._states)
+            self._models_loaded = True
+
+    @property
+    def states(self):
+        """
+        OperationalStates model of the document.
+        """
+        self._load_models()
+        if self._states is None:
+            raise AASError("'OperationalStates' element not found.")
+        return self._states
+
+    @property
+    def services(self):
+        """
+        Index of the 'Services' collection: service idShort -> ServiceRecord, or None when the
+        document has no 'Services' collection.
+        """
+        self._load_models()
+        return self._services or None
+
+    def replace_tree(self, tree):
+        """
+        Installs a new tree (after a committed transaction) and drops everything derived from
+        the previous one.
+        """
+        with self._lock:
+            self._tree = tree
+            self.digest = None
+            self._models_loaded = False
+            self._services = None
+            self._states = None
+
+
+def build_service_index(root):
+    """
+    Walks the 'Services' collection once and returns a dict mapping each service idShort to its
+    ServiceRecord. Returns an empty dict when the collection does not exist.
+    """
+    services = root.find(".//aas:submodelElementCollection[aas:idShort='Services']/aas:value", ns)
+    if services is None:
+        return {}
+    return _index_services(services)
+
+
+def stream_models(file_path):
+    """
+    Returns (service index, OperationalStates or None) from a streaming parse that only keeps the
+    'Services' and 'OperationalStates' collections and stops as soon as both are complete.
+    """
+    services, states = {}, None
+    found = set()
+    with open_document(resolve_path(file_path)) as f:
+        for id_short, element in iter_elements(f, ['Services', 'OperationalStates']):
+            value = element.find(_VALUE)
+            if element.tag != _COLLECTION or value is None or id_short in found:
+                continue
+            found.add(id_short)
+            if id_short == 'Services':
+                services = _index_services(value)
+            else:
+                states = OperationalStates.from_collection(value)
+            if len(found) == 2:
+                break
+    return services, states
+
+
+def _index_services(services):
+    index = {}
+    for service in services.findall("aas:submodelElementCollection", ns):
+        id_short = service.findtext(_ID_SHORT)
+        if id_short is None:
+            continue
+        # Keep the first occurrence of each property, as a find() would
+        properties = {}
+        for prop in service.iter(_PROPERTY):
+            properties.setdefault(prop.findtext(_ID_SHORT), prop.findtext(_VALUE))
+        index[id_short] = ServiceRecord(
+            id_short,
+            properties.get('DriverFunction'),
+            properties.get('Input'),
+            properties.get('Output'),
+            properties.get('Effector'),
+        )
+    return index
+
+
+def _services_collection(root):
+    services = root.find(".//aas:submodelElementCollection[aas:idShort='Services']/aas:value", ns)
+    if services is None:
+        raise AASError("'Services' element not found.")
+    return services
+
+
+def _find_service(services, service_name):
+    for service in services.findall("aas:submodelElementCollection", ns):
+        if service.findtext(_ID_SHORT) == service_name:
+            return service
+    return None
+
+
+def _new_property(parent, id_short, value):
+    prop = ET.SubElement(parent, _PROPERTY)
+    ET.SubElement(prop, _ID_SHORT).text = id_short
+    ET.SubElement(prop, f'{{{AAS_NS}}}valueType').text = 'xs:string'
+    ET.SubElement(prop, _VALUE).text = value
+    return prop
+
+
+def apply_operation(root, operation):
+    """
+    Applies one operation record to the tree rooted at root. Records are plain dicts
+    ({'op': 'add_service' | 'configure_service' | 'remove_service', 'service': name, ...} or
+    {'op': 'set_state', 'state': state}) so they can be replayed on another copy of the document
+    and stored in the journal.
+
+    Raises AASError when the operation does not apply to the document.
+    """
+    kind = operation['op']
+    if kind == 'set_state':
+        OperationalStates.from_root(root).set(operation['state'])
+        return
+
+    service_name = operation['service']
+    services = _services_collection(root)
+    service = _find_service(services, service_name)
+
+    if kind == 'add_service':
+        if service is not None:
+            raise AASError(f"The '{service_name}' service already exists.")
+        service = ET.SubElement(services, _COLLECTION)
+        ET.SubElement(service, _ID_SHORT).text = service_name
+        value = ET.SubElement(service, _VALUE)
+        for id_short in SERVICE_PROPERTIES:
+            _new_property(value, id_short, operation['properties'][id_short])
+
+    elif kind == 'configure_service':
+        if service is None:
+            raise AASError(f"The '{service_name}' service is not available.")
+        for id_short, text in operation['properties'].items():
+            value = service.find(f".//aas:property[aas:idShort='{id_short}']/aas:value", ns)
+            if value is None:
+                container = service.find(_VALUE)
+                if container is None:
+                    container = ET.SubElement(service, _VALUE)
+                _new_property(container, id_short, text)
+            else:
+                value.text = text
+
+    elif kind == 'remove_service':
+        if service is None:
+            raise AASError(f"The '{service_name}' service is not available.")
+        services.remove(service)
+
+    else:
+        raise AASError(f"Unknown AAS operation '{kind}'.")
+
+
+def _states_collection(root):
+    collection = root.find(".//aas:submodelElementCollection[aas:idShort='OperationalStates']/aas:value", ns)
+    if collection is None:
+        raise AASError("'OperationalStates' element not found.")
+    return collection
+
+
+class OperationalStates:
+    """
+    In-memory model of the 'OperationalStates' collection of an AAS document: the states it
+    defines and the current one (whose flag is 'true').
+
+    The model can exist without a parsed tree (from a snapshot or a streamed collection). Once
+    bound to a tree, it keeps references to the state flags ('true'/'false' values of the Idle,
+    Active and Error properties), so a transition is a handful of attribute assignments.
+    """
+    def __init__(self, available, current=None):
+        self.available = tuple(available)
+        self.current = current
+        self._values = None
+
+    @classmethod
+    def from_collection(cls, collection):
+        """
+        Builds the model from the value element of an 'OperationalStates' collection.
+        """
+        available, current = [], None
+        for state_property in collection.findall("aas:property", ns):
+            id_short = state_property.findtext(_ID_SHORT)
+            value = state_property.find(_VALUE)
+            if id_short in VALID_STATES and value is not None:
+                available.append(id_short)
+                if value.text == "true":
+                    current = id_short
+        return cls(available, current)
+
+    @classmethod
+    def from_root(cls, root):
+        states = cls.from_collection(_states_collection(root))
+        states.bind(root)
+        return states
+
+    def bind(self, root):
+        """
+        Attaches the model to the state flags of the tree and writes the current state into them.
+        """
+        collection = _states_collection(root)
+        self._values = {}
+        for state_property in collection.findall("aas:property", ns):
+            id_short = state_property.findtext(_ID_SHORT)
+            value = state_property.find(_VALUE)
+            if id_short in self.available and value is not None:
+                self._values[id_short] = value
+        if self.current is not None:
+            self._write_flags()
+
+    def _write_flags(self):
+        for name, value in self._values.items():
+            value.text = "true" if name == self.current else "false"
+
+    def set(self, state):
+        """
+        Switches the flags to state. Returns False when state is already the current one.
+        """
+        if state not in VALID_STATES:
+            raise AASError(f"Invalid state '{state}'. Valid states are {VALID_STATES}.")
+        if state not in self.available:
+            raise AASError(f"The state '{state}' was not found in 'OperationalStates'.")
+        if state == self.current:
+            return False
+        self.current = state
+        if self._values is not None:
+            self._write_flags()
+        return True
+
+
+class AASDocumentCache:
+    """
+    In-memory cache of parsed AAS documents with mtime/size invalidation.
+
+    The cache is shared by all the robot controllers of the process: two controllers reading the
+    same AAS file work on the same parsed tree. A document with pending state changes is
+    authoritative over the file until it has been flushed.
+    """
+    def __init__(self):
+        self._documents = {}
+        self._lock = threading.RLock()
+        self._persist_timer = None
+
+    def get(self, file_path):
+        """
+        Returns the AASDocument for file_path, parsing the file only if it is not cached yet or
+        if it changed on disk since it was parsed.
+        """
+        path = resolve_path(file_path)
+        with self._lock:
+            document = self._documents.get(path)
+            if document is not None and document.dirty:
+                return document
+            stamp = _document_stamp(path)
+            if document is None or document.stamp != stamp:
+                document = self._load(path, stamp)
+                self._documents[path] = document
+            return document
+
+    def _load(self, path, stamp):
+        digest = content_hash(path)
+        header, records = _read_journal(path, stamp[0])
+        if not records:
+            # Parsed lazily, queries are served from the snapshot or a streaming pass
+            return AASDocument(path, stamp, header, digest=digest, version=stream_version(path))
+        tree = parse_document(path)
+        for record in records:
+            for operation in record['ops']:
+                apply_operation(tree.getroot(), operation)
+        version = _journal_version(records)
+        if version is None:
+            version = tree_version(tree.getroot())
+        return AASDocument(path, stamp, header, tree, digest, version)
+
+    def working_copy(self, file_path):
+        """
+        Returns a deep copy of the cached tree of file_path, taken while no state change is in
+        progress.
+        """
+        with self._lock:
+            return copy.deepcopy(self.get(file_path).tree)
+
+    def commit(self, file_path, operations):
+        """
+        Replays operations on a copy of the current document and writes the result in one atomic
+        write. The cached document is only replaced once the file is on disk: if an operation or
+        the write fails, both the cache and the file are left untouched.
+        """
+        with self._lock:
+            document = self.get(file_path)
+            tree = copy.deepcopy(document.tree)
+            for operation in operations:
+                apply_operation(tree.getroot(), operation)
+            # Pending state changes were part of the copy, they are written along
+            self._write(document, document.pending + [{'ts': time.time(), 'ops': operations}], tree)
+
+    def _write(self, document, records, tree=None):
+        """
+        Writes the records of document (pending state changes and/or a transaction) under the
+        file lock, appended to the journal in journal mode or as a whole document otherwise.
+        tree is the document with the records applied, None when they are applied to
+        document itself.
+
+        If another writer changed the file since document was loaded (see _changed_on_disk), the
+        file is reloaded and the records are replayed on top of it before writing, instead of
+        overwriting that change. An AASError is raised when the records no longer apply (e.g. a
+        service removed meanwhile).
+        """
+        with FileLock(document.path):
+            if self._changed_on_disk(document):
+                document, tree = self._rebase(document, records), None
+            if JOURNAL_MODE:
+                self._append_journal(document, records)
+                if tree is not None:
+                    document.replace_tree(tree)
+            else:
+                self._write_tree(document, tree)
+                if tree is not None:
+                    document.replace_tree(tree)
+            document.pending = []
+            document.dirty = False
+            self._documents[document.path] = document
+            if JOURNAL_MODE:
+                self._compact_if_needed(document)
+
+    @staticmethod
+    def _changed_on_disk(document):
+        """
+        True when the file of document is not the one it was loaded from or last written as: its
+        stamp changed (modified or replaced, even without a version bump) or it has another
+        version. Called with the file lock held.
+        """
+        return (_document_stamp(document.path) != document.stamp
+                or read_version(document.path) != document.version)
+
+    def _rebase(self, document, records):
+        """
+        Returns a fresh document loaded from the file with records replayed on it.
+        """
+        with _aas_errors():
+            fresh = self._load(document.path, _document_stamp(document.path))
+            tree = fresh.tree
+        for record in records:
+            for operation in record['ops']:
+                apply_operation(tree.getroot(), operation)
+        fresh.replace_tree(tree)
+        return fresh
+
+    def _write_tree(self, document, tree=None):
+        """
+        Writes the whole document (or tree) with the next version number and drops the journal,
+        which the XML now contains. Called with the file lock held.
+        """
+        if tree is None:
+            tree = document.tree
+        version = document.version + 1
+        set_tree_version(tree.getroot(), version)
+        _atomic_write(tree, document.path)
+        try:
+            os.remove(journal_path(document.path))
+        except FileNotFoundError:
+            pass
+        document.version = version
+        document.journal = None
+        document.stamp = _document_stamp(document.path)
+        document.digest = None
+        document.pending = []
+        document.dirty = False
+
+    def _append_journal(self, document, records):
+        """
+        Appends records to the journal of document in one write, each record with its version
+        number. A new journal, bound to the current version of the XML file, is started when the
+        document does not extend one yet. Called with the file lock held.
+        """
+        records = [dict(record, v=document.version + i + 1) for i, record in enumerate(records)]
+        if document.journal is None:
+            header = {'base': list(document.stamp[0]), 'created': time.time()}
+            data = _journal_line(header) + b''.join(_journal_line(record) for record in records)
+            mode = 'wb'
+        else:
+            header = document.journal
+            data = b''.join(_journal_line(record) for record in records)
+            mode = 'ab'
+        with open(journal_path(document.path), mode) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        document.version += len(records)
+        document.journal = header
+        document.stamp = _document_stamp(document.path)
+        document.digest = None
+
+    def _compact_if_needed(self, document):
+        size = document.stamp[1][1] if document.stamp[1] else 0
+        age = time.time() - document.journal['created']
+        if size > JOURNAL_MAX_BYTES or age > JOURNAL_MAX_AGE:
+            self._write_tree(document)
+
+    def set_state(self, file_path, state):
+        """
+        Applies a state transition to the in-memory document and schedules its write-behind.
+        Transitions to the current state are no-ops and do not schedule anything.
+        """
+        with self._lock:
+            document = self.get(file_path)
+            if document.states.set(state):
+                document.pending.append({'ts': time.time(), 'ops': [{'op': 'set_state', 'state': state}]})
+                document.dirty = True
+                self._schedule_persist()
+
+    def _schedule_persist(self):
+        # A single timer per cache: every change made before it fires is written in one go
+        if self._persist_timer is None:
+            self._persist_timer = threading.Timer(STATE_PERSIST_DELAY, self._flush_pending)
+            self._persist_timer.daemon = True
+            self._persist_timer.start()
+
+    def _flush_pending(self):
+        try:
+            self.flush()
+        except (OSError, AASError) as e:
+            # Keep the changes in memory and try again at the next interval
+            print(f"Could not persist the AAS operational states: {e}")
+            with self._lock:
+                self._schedule_persist()
+
+    def flush(self):
+        """
+        Writes every document with pending state changes: appended to the journal in journal mode,
+        as a whole document otherwise. Called by the write-behind timer and on interpreter shutdown;
+        can be called directly before handing the files to another tool.
+        """
+        with self._lock:
+            if self._persist_timer is not None:
+                self._persist_timer.cancel()
+                self._persist_timer = None
+            for document in list(self._documents.values()):
+                if document.dirty:
+                    self._write(document, document.pending)
+
+    def compact(self, file_path):
+        """
+        Rebuilds the XML file of file_path from its journal right away.
+        """
+        with self._lock:
+            document = self.get(file_path)
+            with FileLock(document.path):
+                if self._changed_on_disk(document):
+                    document = self._rebase(document, document.pending)
+                self._write_tree(document)
+                self._documents[document.path] = document
+
+    def invalidate(self, file_path=None):
+        """
+        Drops file_path (or every document when no path is given) from the cache. Used after a
+        failed modification so that the next read starts again from the file on disk.
+        """
+        with self._lock:
+            if file_path is None:
+                self._documents.clear()
+            else:
+                self._documents.pop(resolve_path(file_path), None)
+
+
+# Cache shared by every controller of the process
+aas_cache = AASDocumentCache()
+atexit.register(aas_cache.flush)
+
+
+def load_aas(file_path):
+    """
+    Returns the parsed ElementTree of the AAS file, served from the shared cache.
+    """
+    return aas_cache.get(file_path).tree
+
+
+def query_service(file_path, service_name):
+    """
+    Returns the ServiceRecord of service_name from the cached service index of the AAS file.
+
+    Raises ServiceNotAvailable when the service (or the whole 'Services' collection) is missing,
+    and AASError when the file cannot be read or parsed.
+    """
+    with _aas_errors():
+        services = aas_cache.get(file_path).services
+    if services is None:
+        raise ServiceNotAvailable(f"'Services' element not found in '{file_path}'.")
+    try:
+        return services[service_name]
+    except KeyError:
+        raise ServiceNotAvailable(f"The '{service_name}' service is not available.") from None
+
+
+def set_robot_state(file_path, state):
+    """
+    Sets the operational state of the robot described by the AAS file. The change is visible to
+    every reader at once and persisted by the write-behind timer.
+
+    Raises AASError when the state is invalid or the document has no such state.
+    """
+    with _aas_errors():
+        aas_cache.set_state(file_path, state)
+
+
+class AASTransaction:
+    """
+    Batch of changes to the 'Services' collection of an AAS file, committed in a single atomic
+    write.
+
+    Each staged operation is applied at once to a private working copy of the document, so an
+    invalid operation raises AASError when it is staged. Used as a context manager, the
+    transaction commits when the block exits normally and rolls back (nothing is written, the
+    cached document is unchanged) when it exits with an exception:
+
+        with AASTransaction(ned_aas_file) as transaction:
+            transaction.remove_service("Convey")
+            transaction.add_service("ConveyFast", "NULL", "0/1", "convey_until_detect()", "Conveyor")
+            transaction.configure_service("Pick", "picking_angles", "0/1", "vpick()", "Gripper")
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.operations = []
+        self._tree = None
+
+    def _stage(self, operation):
+        if self._tree is None:
+            with _aas_errors():
+                self._tree = aas_cache.working_copy(self.file_path)
+        apply_operation(self._tree.getroot(), operation)
+        self.operations.append(operation)
+
+    def add_service(self, service_name, input_value, output_value, driver_function, effector):
+        self._stage({'op': 'add_service', 'service': service_name, 'properties': {
+            'Input': input_value, 'Output': output_value,
+            'DriverFunction': driver_function, 'Effector': effector}})
+
+    def configure_service(self, service_name, input_value, output_value, driver_function, effector):
+        self._stage({'op': 'configure_service', 'service': service_name, 'properties': {
+            'Input': input_value, 'Output': output_value,
+            'DriverFunction': driver_function, 'Effector': effector}})
+
+    def remove_service(self, service_name):
+        self._stage({'op': 'remove_service', 'service': service_name})
+
+    def commit(self):
+        """
+        Writes every staged operation to the AAS file at once. Does nothing when nothing was staged.
+        """
+        if self.operations:
+            with _aas_errors():
+                aas_cache.commit(self.file_path, self.operations)
+        self.rollback()
+
+    def rollback(self):
+        """
+        Discards the staged operations.
+        """
+        self.operations = []
+        self._tree = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
@@ -0,0 +1,262 @@
+"""
+AAS service composition interfaces shared by every robot controller of the cell.
+
+The controllers (ChaikNiRyo, ChaikWLKATA, ...) inherit them from AASServiceInterface instead of
+carrying their own copy. Every call goes through the AAS repository (aas_repository.py): one
+process-wide cache holds the shell of each asset in memory, parsed once per version of its file
+and shared by all controllers, so adding robots to the cell does not multiply the parsing, and
+queries and updates from several threads are serialized by the repository's locks.
+"""
+
+import inspect
+import threading
+import time
+
+from aas_repository import AASError, AASTransaction, aas_cache, query_service, set_robot_state
+
+# Default logfile of the Service Logs Interface
+METRICS_FILE = "service_metrics.txt"
+
+# Controllers running in parallel threads log to the same file
+_metrics_lock = threading.Lock()
+
+
+def advance_steps(steps, value=None):
+    """
+    Runs driver steps written as a generator (see AASServiceInterface) up to their next wait,
+    value being the result of the previous wait. Returns (False, wait), or (True, result of the
+    steps) once they are finished.
+    """
+    try:
+        return False, steps.send(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+def read_steps(steps):
+    """
+    Runs driver steps written as a generator to the end, each wait read in the calling thread.
+    Returns their result.
+    """
+    done, value = advance_steps(steps)
+    while not done:
+        done, value = advance_steps(steps, value.read())
+    return value
+
+
+class AASServiceInterface:
+    """
+    Mixin giving a robot controller the AAS service composition interfaces. A controller sets
+    'aas_file' to the AAS of its asset (its shell is loaded into the shared cache when the
+    controller is created, see load_shell()) and may override 'metrics_file'.
+
+    'service_steps' describes the services run by run_service(): service method -> (AAS services
+    queried, name in the service metrics, method executing the driver steps). A steps method may
+    be a generator yielding waits, objects with a blocking read() and a coroutine get() (e.g. the
+    grip check of ChaikNiRyo) whose result is sent back into the steps: run_service() reads them
+    in the robot's thread, the asynchronous API (async_services.py) awaits them on its loop.
+
+    'state_publisher', given by the application (e.g. client.state_publisher), publishes the state
+    transitions to the OPC UA server; without one they are only written to the AAS.
+    """
+    aas_file = None
+    metrics_file = METRICS_FILE
+    name = None
+    service_steps = {}
+    state_publisher = None
+
+    def load_shell(self):
+        """
+        Loads the AAS of the asset into the shared cache, so that the first service query of a
+        run does not pay for parsing it. Errors are reported and left to the first query.
+        """
+        if self.aas_file is None:
+            return
+        try:
+            aas_cache.get(self.aas_file).services
+        except (OSError, AASError) as e:
+            print(f"Could not load the AAS '{self.aas_file}': {e}")
+
+    def run_service(self, service, *args):
+        """
+        Runs the service method service of service_steps: the robot is Active while the AAS
+        services are queried and the driver steps run, then back to Idle. The steps return True
+        on success and False on failure, both logged in the service metrics, or None when there
+        was nothing to do (nothing logged). Returns True on success, False otherwise, including
+        when a service is not in the AAS.
+        """
+        service_names, log_name, steps = self.service_steps[service]
+        start_time = time.time()
+
+        # Update robot state to Active before operation
+        self.robot_state_update(self.aas_file, "Active")
+
+        # Check service availability
+        for service_name in service_names:
+            try:
+                self.service_query(self.aas_file, service_name)
+            except AASError:
+                print(f"Service '{service_name}' not available in {self.name} AAS.")
+                self.robot_state_update(self.aas_file, "Idle")
+                return False
+
+        success = getattr(self, steps)(*args)
+        if inspect.isgenerator(success):
+            success = read_steps(success)
+
+        # Log success or failure
+        if success is not None:
+            execution_time = time.time() - start_time if success else 0.0
+            self.service_logs(log_name, success, execution_time)
+
+        # Update robot state to Idle after operation
+        self.robot_state_update(self.aas_file, "Idle")
+        return bool(success)
+
+
+###################################################################################################################################################################
+    """ DECLARATIONS OF AAS SERVICE COMPOSITION INTERFACES FUNCTIONS """
+###################################################################################################################################################################
+
+
+    def service_query(self, file_path, service_name):
+        """
+        The Service Query Interface facilitates the retrieval of data from the AAS.
+        It allows clients to query the Services submodel and obtain the necessary information,
+        for instance, the availability and parameters of services, before performing tasks.
+
+        For example, before the execution of a pick operation by the robot, the Control App
+        will query the AAS to check if the concerned service exists in its registry and to
+        obtain information about its input, output, driver function, and effector.
+        If the service is not found, ServiceNotAvailable is raised. The process might continue
+        executing in case it was a mistake on the AAS side.
+
+        The lookup is served by the service index of the cached AAS document, built once per
+        version of the file. It returns a ServiceRecord (name, driver_function, input, output,
+        effector), fields not specified in the AAS being None.
+        """
+        return query_service(file_path, service_name)
+
+
+############################################################################################################################################
+
+
+    def service_logs(self, service_name, success, execution_time):
+        """
+        The Service Logs Interface is responsible for logging and monitoring the activities
+        and performance of various services and recording them in a logfile. This is achieved
+        through the function 'service_logs()'.
+
+        When a service is called, its status and execution time are appended to the logfile
+        'service metrics.txt' for analysis of our production chain performance and improvement.
+        """
+        # Determine the status of the service based on the success parameter
+        status = "SUCCESS" if success else "FAILURE"
+
+        # Log performance metrics to a text file
+        with _metrics_lock, open(self.metrics_file, 'a') as f:
+            f.write(f"Service: {service_name}, Status: {status}, Execution Time: {execution_time:.2f} seconds\n")
+
+        # Print log entry (optional, for console output)
+        print(f"Service '{service_name}' executed with {status}. Execution time: {execution_time:.2f} seconds.")
+
+
+############################################################################################################################################
+
+
+    def robot_state_update(self, file_path, state):
+        """
+        The Robot State Update Interface is designed to manage the operational states of robotic assets
+        within the AAS (Asset Administration Shell). This interface allows for dynamic modifications to
+        represent each robot's current state, such as Active, Inactive, or Maintenance. The function
+        'robot_state_update()' updates the operational state of the robot in the AAS XML file.
+
+        The transition is applied to the cached AAS document immediately and written behind:
+        flips such as Active -> Idle -> Active within STATE_PERSIST_DELAY are coalesced into a single
+        atomic rewrite of the file. With a state_publisher, it is also published in the background
+        to the 'vPLC/<asset>/OperationalState' variable of the OPC UA server for live monitoring.
+        """
+        try:
+            set_robot_state(file_path, state)
+        except AASError as e:
+            error_message = f"Error: {e}"
+            print(error_message)
+            return error_message
+        if self.state_publisher is not None:
+            self.state_publisher.publish(file_path, state)
+        print(f"The robot state has been updated to '{state}'.")
+        return f"The robot state has been updated to '{state}'."
+
+
+###########################################################################################################################################
+
+
+    def configure_service(self, file_path, service_name, input_value, output_value, driver_function, effector):
+        """
+        The Dynamic Service Configuration Interface enables updates to services within the AAS,
+        allowing users to add, remove, and modify service configurations dynamically.
+        It is crucial for maintaining an adaptive and responsive production environment.
+
+        This function dynamically configures the specified service in the AAS XML file.
+        It is a single-operation AASTransaction; to reconfigure several services at once, stage
+        them in one AASTransaction so they are written together in a single atomic write.
+
+        Parameters:
+            file_path (str): The path to the AAS XML file.
+            service_name (str): The name of the service to be configured.
+            input_value (str): The input value to be set for the service.
+            output_value (str): The output value to be set for the service.
+            driver_function (str): The driver function to be set for the service.
+            effector (str): The effector value to be set for the service.
+        """
+        try:
+            with AASTransaction(file_path) as transaction:
+                transaction.configure_service(service_name, input_value, output_value, driver_function, effector)
+            print(f"The '{service_name}' service has been configured.")
+        except AASError as e:
+            print(e)
+
+
+###########################################################################################################################################
+
+
+    def add_service(self, file_path, service_name, input_value, output_value, driver_function, effector):
+        """
+        The Dynamic Service Configuration Interface enables the dynamic addition of new services,
+        integrating with existing systems.
+
+        This function adds a new service to the AAS XML file.
+
+        Parameters:
+            file_path (str): The path to the AAS XML file.
+            service_name (str): The name of the new service to be added.
+            input_value (str): The input value to be set for the new service.
+            output_value (str): The output value to be set for the new service.
+            driver_function (str): The driver function to be set for the new service.
+            effector (str): The effector value to be set for the new service.
+        """
+        try:
+            with AASTransaction(file_path) as transaction:
+                transaction.add_service(service_name, input_value, output_value, driver_function, effector)
+            print(f"The '{service_name}' service has been added.")
+        except AASError as e:
+            print(e)
+
+
+    def remove_service(self, file_path, service_name):
+        """
+        The Dynamic Service Configuration Interface allows for the removal of unnecessary services
+        to optimize performance and resource utilization.
+
+        This function removes a specified service from the AAS XML file.
+
+        Parameters:
+            file_path (str): The path to the AAS XML file.
+            service_name (str): The name of the service to be removed.
+        """
+        try:
+            with AASTransaction(file_path) as transaction:
+                transaction.remove_service(service_name)
+            print(f"The '{service_name}' service has been removed.")
+        except AASError as e:
+            print(e)
@@ -0,0 +1,286 @@
+"""
+Direct access to AASX packages without unpacking them.
+
+An AASX file is an Open Packaging Conventions (zip) package. The AAS environment ('aas-spec' part)
+is found through the relationships: '_rels/.rels' points to the 'aasx-origin' part, whose
+relationships point to the spec part, whose own relationships list the supplementary files
+(thumbnails, documentation, CAD...). The spec is parsed straight from the archive; supplementary
+files are only decompressed when they are asked for.
+"""
+
+import os
+import copy
+import platform
+import posixpath
+import shutil
+import struct
+import sys
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+
+RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_RELATIONSHIP = f'{{{RELS_NS}}}Relationship'
+
+# Relationship types, compared without scheme and 'www.' since both spellings are found in the wild
+REL_AASX_ORIGIN = 'admin-shell.io/aasx/relationships/aasx-origin'
+REL_AAS_SPEC = 'admin-shell.io/aasx/relationships/aas-spec'
+REL_AAS_SUPPL = 'admin-shell.io/aasx/relationships/aas-suppl'
+REL_THUMBNAIL = 'schemas.openxmlformats.org/package/2006/relationships/metadata/thumbnail'
+
+# General purpose flag of a member whose sizes and CRC follow its data
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+# Copying parts with their compressed bytes relies on zipfile internals (local header layout,
+# ZipFile bookkeeping) that are only known to be stable on these CPython versions. Elsewhere every
+# part is decompressed and compressed again through the public API.
+RAW_COPY = (platform.python_implementation() == 'CPython' and (3, 9) <= sys.version_info[:2] <= (3, 13)
+            and all(hasattr(zipfile, name) for name in ('sizeFileHeader', 'stringFileHeader', 'structFileHeader',
+                                                        '_FH_FILENAME_LENGTH', '_FH_EXTRA_FIELD_LENGTH')))
+
+
+class AASXError(Exception):
+    """
+    Raised when a file is not a usable AASX package.
+    """
+
+
+def _relationship_type(uri):
+    uri = uri.split('://', 1)[-1]
+    if uri.startswith('www.'):
+        uri = uri[4:]
+    return uri
+
+
+def _rels_name(part_name):
+    """
+    Name of the relationships part of part_name ('' is the package itself).
+    """
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, '_rels', name + '.rels')
+
+
+class AASXPackage:
+    """
+    Read access to an AASX package. Use as a context manager, or call close() when done:
+
+        with AASXPackage("~/Runchain_Services/NiryoNed2AAS.aasx") as package:
+            tree = ET.parse(package.open_spec())
+            png = package.read(package.thumbnail_name)
+    """
+    def __init__(self, file_path):
+        self.path = os.path.realpath(os.path.expanduser(file_path))
+        try:
+            self._zip = zipfile.ZipFile(self.path)
+        except zipfile.BadZipFile as e:
+            raise AASXError(f"'{file_path}' is not an AASX package: {e}") from e
+        self._names = set(self._zip.namelist())
+        self._spec_name = None
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def relationships(self, part_name=''):
+        """
+        Returns the (type, target part name) relationships of part_name, targets resolved to
+        names inside the archive. Types are normalized (see _relationship_type).
+        """
+        rels_name = _rels_name(part_name)
+        if rels_name not in self._names:
+            return []
+        root = ET.fromstring(self._zip.read(rels_name))
+        relationships = []
+        for relationship in root.iter(_RELATIONSHIP):
+            target = relationship.get('Target', '')
+            if target.startswith('/'):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(posixpath.dirname(part_name), target))
+            relationships.append((_relationship_type(relationship.get('Type', '')), target))
+        return relationships
+
+    def _related(self, part_name, relationship_type):
+        return [target for kind, target in self.relationships(part_name)
+                if kind == relationship_type and target in self._names]
+
+    @property
+    def spec_name(self):
+        """
+        Name of the AAS environment part. Resolved through the aasx-origin relationships; packages
+        whose relationships point to a missing part fall back to the '*.aas.xml' part, then to the
+        first XML part holding an AAS environment.
+        """
+        if self._spec_name is None:
+            self._spec_name = self._resolve_spec()
+        return self._spec_name
+
+    def _resolve_spec(self):
+        for origin in self._related('', REL_AASX_ORIGIN):
+            specs = self._related(origin, REL_AAS_SPEC)
+            if specs:
+                return specs[0]
+        candidates = sorted(name for name in self._names if name.endswith('.aas.xml'))
+        if candidates:
+            return candidates[0]
+        for info in self._zip.infolist():
+            name = info.filename
+            if name.endswith('.rels') or name == '[Content_Types].xml' or info.is_dir():
+                continue
+            with self._zip.open(info) as f:
+                head = f.read(512)
+            if b'<environment' in head or b':environment' in head:
+                return name
+        raise AASXError(f"No AAS environment found in '{self.path}'.")
+
+    def open_spec(self):
+        """
+        Returns a binary file object streaming the AAS environment out of the archive.
+        """
+        return self._zip.open(self.spec_name)
+
+    def read_spec(self):
+        return self._zip.read(self.spec_name)
+
+    @property
+    def supplementary_names(self):
+        """
+        Names of the supplementary files of the spec part (nothing is decompressed).
+        """
+        return self._related(self.spec_name, REL_AAS_SUPPL)
+
+    @property
+    def thumbnail_name(self):
+        """
+        Name of the package thumbnail, or None.
+        """
+        thumbnails = self._related('', REL_THUMBNAIL)
+        return thumbnails[0] if thumbnails else None
+
+    def read(self, name):
+        """
+        Decompresses and returns one file of the package.
+        """
+        return self._zip.read(name)
+
+    def extract(self, name, directory):
+        """
+        Extracts one file of the package into directory and returns its path.
+        """
+        target = os.path.join(os.path.expanduser(directory), posixpath.basename(name))
+        with self._zip.open(name) as source, open(target, 'wb') as f:
+            shutil.copyfileobj(source, f)
+        return target
+
+
+def _read_raw(source, info):
+    """
+    Returns the compressed bytes of the member info, read from the archive file source past its
+    local header (zipfile has no public API for it).
+    """
+    source.seek(info.header_offset)
+    header = source.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader or header[:4] != zipfile.stringFileHeader:
+        raise AASXError(f"Bad local header for '{info.filename}'.")
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    source.seek(fields[zipfile._FH_FILENAME_LENGTH] + fields[zipfile._FH_EXTRA_FIELD_LENGTH], os.SEEK_CUR)
+    return source.read(info.compress_size)
+
+
+def _write_raw(target, info, raw):
+    """
+    Appends the member info to the ZipFile target with its already compressed bytes raw, as
+    writestr() would after compressing it.
+    """
+    if not hasattr(target, '_didModify') or not hasattr(target, 'start_dir'):
+        raise AASXError("Unsupported zipfile version for a raw copy.")
+    zinfo = copy.copy(info)
+    # Sizes and CRC are known: they go in the local header
+    zinfo.flag_bits &= ~_DATA_DESCRIPTOR_FLAG
+    zinfo.header_offset = target.fp.tell()
+    target.fp.write(zinfo.FileHeader())
+    target.fp.write(raw)
+    target.filelist.append(zinfo)
+    target.NameToInfo[zinfo.filename] = zinfo
+    target.start_dir = target.fp.tell()
+    target._didModify = True
+
+
+def _copy_raw(package, source_path, data, f):
+    """
+    Writes the package to the empty binary file f with data as its spec part, the other parts
+    copied with their compressed bytes, then reads the result back through the public API: every
+    local header must open and every part must keep its CRC. Returns False when anything fails,
+    f then holding an unusable archive.
+    """
+    spec_name = package.spec_name
+    infos = package._zip.infolist()
+    try:
+        with zipfile.ZipFile(f, 'w') as target, open(source_path, 'rb') as source:
+            for info in infos:
+                if info.filename == spec_name:
+                    target.writestr(copy.copy(info), data)
+                else:
+                    _write_raw(target, info, _read_raw(source, info))
+        f.seek(0)
+        with zipfile.ZipFile(f) as check:
+            if [info.filename for info in check.infolist()] != [info.filename for info in infos]:
+                return False
+            for info, copied in zip(infos, check.infolist()):
+                if info.filename == spec_name:
+                    # read() checks the CRC of the new spec part
+                    check.read(copied)
+                elif copied.CRC != info.CRC or copied.file_size != info.file_size:
+                    return False
+                else:
+                    check.open(copied).close()
+    except Exception:
+        return False
+    return True
+
+
+def _copy_recompressed(package, data, f):
+    """
+    Writes the package to the empty binary file f with data as its spec part, every part being
+    decompressed and compressed again with its original method (public zipfile API only).
+    """
+    spec_name = package.spec_name
+    with zipfile.ZipFile(f, 'w') as target:
+        for info in package._zip.infolist():
+            target.writestr(copy.copy(info), data if info.filename == spec_name else package.read(info.filename))
+
+
+def replace_spec(file_path, data):
+    """
+    Rewrites the AASX package with data as its AAS environment part. The package is rebuilt in a
+    temporary file next to it and renamed over it. Only the spec part is compressed again: every
+    other part (thumbnails, supplementary files) is copied with its compressed bytes as they are
+    (see RAW_COPY). If that copy fails or does not read back intact, the package is rebuilt with
+    every part recompressed instead.
+    """
+    path = os.path.realpath(os.path.expanduser(file_path))
+    with AASXPackage(path) as package:
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp',
+                                        dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'w+b') as f:
+                if not (RAW_COPY and _copy_raw(package, path, data, f)):
+                    f.seek(0)
+                    f.truncate()
+                    _copy_recompressed(package, data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
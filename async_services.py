@@ -0,0 +1,221 @@
+"""
+Asyncio API of the robot services.
+
+AsyncChaikNiRyo and AsyncChaikWLKATA expose the services of ChaikNiRyo and ChaikWLKATA as
+coroutines, so that one event loop drives both robots and the OPC UA session of client.py:
+
+- the blocking driver calls (pyniryo, wlkata_mirobot) run in the robot's own single-thread
+  executor: the motions of one robot stay in order while the robots move in parallel;
+- the AAS service query and the Active state update opening a service, and the metrics write and
+  the Idle state update closing it, are awaited concurrently on a small shared executor;
+- the flow of a service (driver steps, grip check, success or failure) is not repeated here: the
+  service runs the steps declared by the controller (service_steps of ChaikNiRyo and
+  ChaikWLKATA) in the robot's thread, as run_service() does for the synchronous API;
+- the waits yielded by the steps, such as the grip check after a grasp, are awaited on the loop
+  (PressureMonitor.get) instead of blocking the robot's thread.
+
+    async def main():
+        async with robot_cell() as (ned, wl):
+            await ned.load_piece()
+            await asyncio.gather(ned.convey_until_detect(), wl.move_conveyor(100))
+
+    asyncio.run(main())
+"""
+
+import asyncio
+import contextlib
+import functools
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aas_repository import AASError
+from aas_services import advance_steps
+import ChaikmatWLKATA
+import NiRyo_ChaikMat_Ecosyspro
+from client import opcua_sessions, pressure_monitor
+
+# Threads of the shared executor for the AAS updates and metrics writes (short, file-bound calls)
+AAS_WORKERS = 4
+
+_aas_executor = ThreadPoolExecutor(max_workers=AAS_WORKERS, thread_name_prefix="aas")
+
+
+class AsyncRobot:
+    """
+    Asynchronous wrapper of a robot controller (an AASServiceInterface). The controller is
+    created, and every driver call made, in the robot's executor thread; the AAS interfaces run
+    on the shared AAS executor. Use create() to build one from the event loop.
+    """
+    controller_class = None
+    name = None
+
+    def __init__(self):
+        self.controller = None
+        # One thread: the robot executes one motion at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"robot-{self.name}")
+
+    @classmethod
+    async def create(cls, state_publisher=None):
+        robot = cls()
+        robot.controller = await robot.run(cls.controller_class)
+        robot.controller.state_publisher = state_publisher
+        await robot.setup()
+        return robot
+
+    async def setup(self):
+        pass
+
+    async def run(self, function, *args):
+        """
+        Runs the blocking call function(*args) in the robot's thread.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args))
+
+    async def _aas(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(_aas_executor, functools.partial(function, *args))
+
+    async def call(self, method, *args):
+        """
+        Runs the controller method named method (e.g. "neutral") in the robot's thread.
+        """
+        return await self.run(getattr(self.controller, method), *args)
+
+    async def service_query(self, service_name):
+        return await self._aas(self.controller.service_query, self.controller.aas_file, service_name)
+
+    async def robot_state_update(self, state):
+        return await self._aas(self.controller.robot_state_update, self.controller.aas_file, state)
+
+    async def service_logs(self, service_name, success, execution_time):
+        await self._aas(self.controller.service_logs, service_name, success, execution_time)
+
+    async def _begin(self, *service_names):
+        # Opens a service: Active state and service queries together. Returns False if a service
+        # is not in the AAS (the robot is back to Idle).
+        results = await asyncio.gather(self.robot_state_update("Active"),
+                                       *(self.service_query(name) for name in service_names),
+                                       return_exceptions=True)
+        for service_name, result in zip(service_names, results[1:]):
+            if isinstance(result, AASError):
+                print(f"Service '{service_name}' not available in {self.name} AAS.")
+                await self.robot_state_update("Idle")
+                return False
+            if isinstance(result, Exception):
+                raise result
+        return True
+
+    async def _end(self, log_name, success, start_time):
+        # Closes a service: metrics and Idle state together (no metrics when success is None:
+        # nothing was done)
+        if success is None:
+            await self.robot_state_update("Idle")
+            return
+        execution_time = time.time() - start_time if success else 0.0
+        await asyncio.gather(self.service_logs(log_name, success, execution_time), self.robot_state_update("Idle"))
+
+    async def service(self, service, *args):
+        """
+        Asynchronous run_service(): runs the service method service of the controller's
+        service_steps, its driver steps in the robot's thread. Returns True on success, False
+        otherwise.
+        """
+        service_names, log_name, steps = self.controller.service_steps[service]
+        start_time = time.time()
+        if not await self._begin(*service_names):
+            return False
+        success = await self.call(steps, *args)
+        if inspect.isgenerator(success):
+            success = await self._await_steps(success)
+        await self._end(log_name, success, start_time)
+        return bool(success)
+
+    async def _await_steps(self, steps):
+        # Generator steps: run in the robot's thread up to each wait, awaited on the loop
+        done, value = await self.run(advance_steps, steps)
+        while not done:
+            done, value = await self.run(advance_steps, steps, await value.get())
+        return value
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+class AsyncChaikNiRyo(AsyncRobot):
+    """
+    Services of the Niryo Ned2 (ChaikNiRyo) as coroutines.
+    """
+    controller_class = NiRyo_ChaikMat_Ecosyspro.ChaikNiRyo
+    name = "Niryo"
+
+    async def setup(self):
+        await self.call("setup")
+
+    async def convey_until_detect(self):
+        return await self.service("convey_until_detect")
+
+    async def load_piece(self):
+        return await self.service("load_piece")
+
+    async def load_and_convey(self):
+        """
+        load_piece and convey_until_detect in one service (see ChaikNiRyo.load_and_convey()).
+        """
+        return await self.service("load_and_convey")
+
+    async def put_back_piece(self):
+        return await self.service("put_back_piece")
+
+    async def pick_my_thing(self, shape_exp, color_exp, number):
+        return await self.service("pick_my_thing", shape_exp, color_exp, number)
+
+    async def pick_for_plan(self, plan):
+        """
+        Places a piece of the workspace inventory on an arch slot of plan that needs it and
+        removes the slot from plan; False, with no metrics entry, if no piece in view is needed (see
+        ChaikNiRyo.pick_for_plan()).
+        """
+        return await self.service("pick_for_plan", plan)
+
+
+class AsyncChaikWLKATA(AsyncRobot):
+    """
+    Services of the Wlkata Mirobot (ChaikWLKATA) as coroutines. Like the controller, they
+    return True on success and False on failure.
+    """
+    controller_class = ChaikmatWLKATA.ChaikWLKATA
+    name = "Wlkata"
+
+    async def pick(self, color, shape):
+        return await self.service("pick", color, shape)
+
+    async def release_to_Ned(self):
+        return await self.service("release_to_Ned")
+
+    async def move_conveyor(self, position):
+        return await self.service("move_conveyor", position)
+
+
+@contextlib.asynccontextmanager
+async def robot_cell(state_publisher=None):
+    """
+    Runs the OPC UA sessions in the current event loop, creates both robots in parallel and yields
+    (ned, wl). Their state transitions are published with state_publisher (e.g.
+    client.state_publisher), if given. On exit, stops the pressure subscription, closes the
+    sessions and the executors.
+    """
+    opcua_sessions.attach()
+    robots = []
+    try:
+        results = await asyncio.gather(AsyncChaikNiRyo.create(state_publisher), AsyncChaikWLKATA.create(state_publisher),
+                                       return_exceptions=True)
+        robots = [result for result in results if isinstance(result, AsyncRobot)]
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        yield tuple(robots)
+    finally:
+        pressure_monitor.stop()
+        await opcua_sessions.aclose()
+        for robot in robots:
+            robot.close()
@@ -0,0 +1,211 @@
+"""
+Load generator for the OPC UA server (Server.py) and client (client.py).
+
+Starts a local server (unless --url points to a running one) and runs N simulated controllers,
+each with its own OPC UA session, reading the pressure at a given rate and downloading an AASX
+package at a given interval. Prints (or writes with --output) a JSON report: latency
+percentiles and throughput per operation, and the CPU and memory use of the local server.
+
+    python benchmark.py --clients 20 --pressure-rate 20 --download-interval 5 --duration 30
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from asyncua import Client
+
+import client as opcua_client
+
+LOCAL_URL = "opc.tcp://127.0.0.1:48401/opcua/"
+REPO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PERCENTILES = (50, 90, 95, 99)
+MONITOR_INTERVAL = 0.5  # s
+
+
+def serve(url, directory):
+    """
+    Runs Server.py on url, serving the AASX packages found in directory.
+    """
+    import Server
+    Server.OPC_UA_URL = url
+    Server.AASX_FILES = {name: os.path.join(directory, name) for name in opcua_client.AASX_FILES}
+    asyncio.run(Server.main())
+
+
+class Recorder:
+    """
+    Latencies (s) and errors of one kind of operation.
+    """
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    async def measure(self, coro):
+        start = time.perf_counter()
+        try:
+            await coro
+        except Exception:
+            self.errors += 1
+            return
+        self.latencies.append(time.perf_counter() - start)
+
+    def report(self, duration):
+        latencies = np.array(self.latencies) * 1000
+        report = {
+            "count": len(latencies),
+            "errors": self.errors,
+            "throughput_per_s": round(len(latencies) / duration, 2),
+        }
+        if len(latencies):
+            report["latency_ms"] = {f"p{p}": round(float(np.percentile(latencies, p)), 3) for p in PERCENTILES}
+            report["latency_ms"]["mean"] = round(float(latencies.mean()), 3)
+            report["latency_ms"]["max"] = round(float(latencies.max()), 3)
+        return report
+
+
+async def simulated_controller(url, deadline, args, pressure, download, directory, number):
+    """
+    One controller: its own session, periodic pressure reads and AASX downloads.
+    """
+    node_ids = opcua_client.NodeIdCache()
+    async with Client(url=url) as client:
+        await node_ids.validate(client)
+        next_download = time.monotonic() + args.download_interval if args.download_interval else None
+        period = 1.0 / args.pressure_rate if args.pressure_rate else None
+        next_read = time.monotonic()
+        while time.monotonic() < deadline:
+            now = time.monotonic()
+            if next_download is not None and now >= next_download:
+                path = os.path.join(directory, f"{number}-{args.file}")
+                await download.measure(opcua_client._download_file(client, args.file, path, node_ids))
+                next_download += args.download_interval
+            if period is not None:
+                await pressure.measure(opcua_client._read_pressure(client, node_ids))
+                next_read += period
+            else:
+                next_read = next_download or deadline
+            await asyncio.sleep(max(0.0, min(next_read, deadline) - time.monotonic()))
+
+
+def _process_sample(pid):
+    # (CPU seconds, resident memory in bytes) of pid, from /proc (Linux)
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return cpu, resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+async def monitor_process(pid, samples, stop):
+    previous = _process_sample(pid)
+    previous_time = time.monotonic()
+    while not stop.is_set():
+        await asyncio.sleep(MONITOR_INTERVAL)
+        sample = _process_sample(pid)
+        now = time.monotonic()
+        if sample is None or previous is None:
+            continue
+        samples.append({"cpu_percent": 100 * (sample[0] - previous[0]) / (now - previous_time),
+                        "rss_mb": sample[1] / 2**20})
+        previous, previous_time = sample, now
+
+
+async def run(args, server_pid):
+    pressure, download = Recorder(), Recorder()
+    server_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_process(server_pid, server_samples, stop)) if server_pid else None
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.monotonic()
+        deadline = start + args.duration
+        results = await asyncio.gather(*(
+            simulated_controller(args.url, deadline, args, pressure, download, directory, number)
+            for number in range(args.clients)), return_exceptions=True)
+        duration = time.monotonic() - start
+    stop.set()
+    if monitor is not None:
+        await monitor
+
+    report = {
+        "config": {"url": args.url, "clients": args.clients, "duration_s": args.duration,
+                   "pressure_rate_per_client": args.pressure_rate,
+                   "download_interval_s": args.download_interval, "file": args.file},
+        "sessions_failed": sum(1 for result in results if isinstance(result, Exception)),
+        "pressure": pressure.report(duration),
+        "download": download.report(duration),
+    }
+    if server_samples:
+        cpu = [sample["cpu_percent"] for sample in server_samples]
+        rss = [sample["rss_mb"] for sample in server_samples]
+        report["server"] = {"cpu_percent_mean": round(sum(cpu) / len(cpu), 1), "cpu_percent_max": round(max(cpu), 1),
+                            "rss_mb_mean": round(sum(rss) / len(rss), 1), "rss_mb_max": round(max(rss), 1)}
+    return report
+
+
+async def wait_for_server(url, server, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError("The local OPC UA server exited during startup.")
+        try:
+            async with Client(url=url, timeout=1):
+                return
+        except (OSError, asyncio.TimeoutError):
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=10, help="simulated controllers (one session each)")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--pressure-rate", type=float, default=10.0, help="pressure reads per second per client (0: none)")
+    parser.add_argument("--download-interval", type=float, default=10.0, help="seconds between AASX downloads per client (0: none)")
+    parser.add_argument("--file", default=opcua_client.AASX_FILES[0], help="AASX package downloaded")
+    parser.add_argument("--url", default=None, help="existing server to load (default: start one locally)")
+    parser.add_argument("--aasx-directory", default=REPO_DIRECTORY, help="AASX packages served by the local server")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--serve", metavar="URL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.aasx_directory)
+        return
+
+    server = None
+    if args.url is None:
+        args.url = LOCAL_URL
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", args.url,
+                                   "--aasx-directory", args.aasx_directory],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if server is not None:
+            asyncio.run(wait_for_server(args.url, server))
+        report = asyncio.run(run(args, server.pid if server is not None else None))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
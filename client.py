@@ -2,7 +2,13 @@ import asyncio
 import logging
 from asyncua import Client, ua
 import aiofiles
+import atexit
+import json
 import os
+import threading
+import time
+
+from aas_repository import FileLock, resolve_path
 
 logger = logging.getLogger('asyncua')
 logging.disable(logging.WARNING)
@@ -12,42 +18,615 @@ NAMESPACE = "mynamespace"
 DATA_VARIABLES = ["pression"]
 AASX_FILES = ["NiryoNed2AAS.aasx", "WlkataMirobotAAS.aasx"]
 CLIENT_FILE_PATH = os.path.expanduser("~/Runchain_Services/")
+# Hash publié par le serveur pour chaque fichier (variable '<nom du fichier>.sha256')
+HASH_SUFFIX = ".sha256"
+# Hashes serveur des fichiers téléchargés, pour ne pas les transférer à nouveau s'ils n'ont pas changé
+SYNC_MANIFEST = os.path.join(CLIENT_FILE_PATH, ".aasx_sync.json")
+# Taille des blocs demandés à la méthode Read des objets fichier (FileType) du serveur
+FILE_CHUNK_SIZE = 64 * 1024
+FILE_MODE_READ = 0x1
+
+# Sessions OPC-UA gardées ouvertes entre les appels
+POOL_SIZE = 2
+CONNECT_TIMEOUT = 4  # s
+REQUEST_TIMEOUT = 10  # s
+SESSION_TIMEOUT = 60000  # ms
+KEEPALIVE_INTERVAL = 5.0  # s, lecture périodique de l'état du serveur par asyncua
+
+# Abonnement à la pression
+SUBSCRIPTION_PERIOD = 50  # ms, période de publication demandée au serveur
+FRESH_SAMPLE_TIMEOUT = 0.5  # s, attente maximale d'un échantillon postérieur à la prise
+RECONNECT_DELAY = 2.0  # s
+
+# Erreurs après lesquelles une session est fermée et rouverte
+CONNECTION_ERRORS = (
+    ConnectionError, OSError, asyncio.TimeoutError,
+    ua.uaerrors.BadSessionIdInvalid, ua.uaerrors.BadSessionClosed,
+    ua.uaerrors.BadSecureChannelIdInvalid, ua.uaerrors.BadConnectionClosed,
+)
+
+
+class NodeIdCache:
+    """
+    NodeIds résolus des variables du serveur, indexés par chemin de navigation sous Objects
+    (par exemple ("vPLC", "pression")), dans l'espace de noms NAMESPACE.
+
+    Les noms déjà qualifiés ("0:Open") sont gardés tels quels.
+    Un chemin n'est parcouru (get_child) qu'une fois ; ensuite le nœud est construit localement
+    depuis son NodeId, sans requête. Le cache est vérifié une fois par session (validate) :
+    si le tableau des espaces de noms ou l'heure de démarrage du serveur ont changé, il est vidé.
+    Utilisé depuis la boucle du pool.
+    """
+    def __init__(self, namespace=NAMESPACE):
+        self.namespace = namespace
+        self._node_ids = {}
+        self._epoch = None
+        self._namespace_idx = None
+
+    async def validate(self, client):
+        namespaces = tuple(await client.get_namespace_array())
+        start_time = await client.get_node(ua.ObjectIds.Server_ServerStatus_StartTime).read_value()
+        epoch = (namespaces, start_time)
+        if epoch != self._epoch:
+            self._node_ids.clear()
+            self._epoch = epoch
+            self._namespace_idx = namespaces.index(self.namespace) if self.namespace in namespaces else None
+
+    def clear(self):
+        self._node_ids.clear()
+
+    async def node(self, client, *path):
+        """
+        Retourne le nœud du chemin path (noms sans index d'espace de noms).
+        """
+        node_id = self._node_ids.get(path)
+        if node_id is not None:
+            return client.get_node(node_id)
+        if self._namespace_idx is None:
+            raise ValueError(f"Namespace '{self.namespace}' is not registered on the server.")
+        node = await client.nodes.objects.get_child(
+            [name if ":" in name else "{}:{}".format(self._namespace_idx, name) for name in path])
+        self._node_ids[path] = node.nodeid
+        return node
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.debug("OPC-UA request failed: %s", future.exception())
+
+
+class OPCUASessionPool:
+    """
+    Petit pool de sessions OPC-UA persistantes vers le serveur du vPLC.
+
+    Les sessions sont ouvertes à la première utilisation et réutilisées ensuite : une lecture ne
+    coûte plus qu'un aller-retour, sans reconnexion TCP, SecureChannel ni session. Elles vivent
+    dans une boucle asyncio dédiée (thread de fond), ce qui permet de les utiliser aussi bien
+    depuis du code asynchrone (await pool.call(fn)) que synchrone (pool.call_sync(fn)).
+    fn est une coroutine recevant le Client : async def fn(client, *args).
+
+    Le keep-alive est assuré par le watchdog d'asyncua ; une session perdue (serveur redémarré,
+    réseau coupé) est rouverte et la requête rejouée une fois. Les nœuds sont adressés par
+    leur chemin à travers node_ids, le NodeIdCache partagé par les sessions du pool.
+    """
+    def __init__(self, url=OPC_UA_URL, size=POOL_SIZE, node_ids=None):
+        self.url = url
+        self.size = size
+        self.node_ids = node_ids if node_ids is not None else NodeIdCache()
+        self._loop = None
+        self._thread = None
+        self._idle = None
+        self._start_lock = threading.Lock()
+
+    def attach(self):
+        """
+        Fait tourner les sessions dans la boucle asyncio courante au lieu du thread de fond : une
+        application asynchrone (async_services.py) pilote alors les robots et les sessions depuis
+        une seule boucle. À appeler dans cette boucle avant toute utilisation du pool, puis
+        fermer le pool avec await pool.aclose().
+        """
+        loop = asyncio.get_running_loop()
+        with self._start_lock:
+            if self._loop is not None and self._loop is not loop:
+                raise RuntimeError("Le pool de sessions OPC-UA tourne déjà dans une autre boucle.")
+            self._loop = loop
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="opcua-sessions", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    async def _connect(self):
+        client = Client(url=self.url, timeout=CONNECT_TIMEOUT, watchdog_intervall=KEEPALIVE_INTERVAL)
+        client.session_timeout = SESSION_TIMEOUT
+        await client.connect()
+        try:
+            await self.node_ids.validate(client)
+        except BaseException:
+            await self._disconnect(client)
+            raise
+        return client
+
+    async def _disconnect(self, client):
+        try:
+            await client.disconnect()
+        except Exception:
+            pass
+
+    async def _acquire(self):
+        if self._idle is None:
+            # None : emplacement libre, la session sera ouverte à la demande
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(None)
+        client = await self._idle.get()
+        if client is None:
+            try:
+                client = await self._connect()
+            except BaseException:
+                self._idle.put_nowait(None)
+                raise
+        return client
+
+    async def _run(self, fn, *args):
+        client = await self._acquire()
+        try:
+            try:
+                await client.check_connection()
+                return await self._call_resolved(fn, client, *args)
+            except CONNECTION_ERRORS as e:
+                logger.debug("OPC-UA session lost (%s), reconnecting", e)
+                await self._disconnect(client)
+                client = None
+                client = await self._connect()
+                return await self._call_resolved(fn, client, *args)
+        finally:
+            self._idle.put_nowait(client)
+
+    async def _call_resolved(self, fn, client, *args):
+        try:
+            return await fn(client, *args)
+        except ua.uaerrors.BadNodeIdUnknown:
+            # Espace d'adressage modifié sans redémarrage du serveur : chemins à résoudre à nouveau
+            self.node_ids.clear()
+            return await fn(client, *args)
+
+    async def call(self, fn, *args):
+        """
+        Exécute fn(client, *args) sur une session du pool, depuis n'importe quelle boucle asyncio.
+        """
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await self._run(fn, *args)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._run(fn, *args), loop))
+
+    def submit(self, coro):
+        """
+        Lance la coroutine coro dans la boucle du pool et retourne son concurrent.futures.Future.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def call_soon(self, fn, *args):
+        """
+        Lance fn(client, *args) sur une session du pool sans attendre le résultat ; les erreurs
+        sont journalisées.
+        """
+        future = self.submit(self._run(fn, *args))
+        future.add_done_callback(_log_failure)
+        return future
+
+    def call_sync(self, fn, *args, timeout=REQUEST_TIMEOUT):
+        """
+        Exécute fn(client, *args) sur une session du pool depuis du code synchrone.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._run(fn, *args), self._ensure_loop())
+        return future.result(timeout)
+
+    async def _close(self):
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            if client is not None:
+                await self._disconnect(client)
+        self._idle = None
+
+    async def aclose(self):
+        """
+        Ferme les sessions ouvertes d'un pool rattaché à la boucle courante (attach()).
+        """
+        await self._close()
+        with self._start_lock:
+            self._loop = None
+
+    def close(self):
+        """
+        Ferme les sessions ouvertes et arrête la boucle du pool.
+        """
+        with self._start_lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or thread is None:
+            # Boucle de l'application (attach()) : les sessions sont fermées par aclose()
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), loop).result(REQUEST_TIMEOUT)
+        except Exception as e:
+            logger.debug("Error closing the OPC-UA sessions: %s", e)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(REQUEST_TIMEOUT)
+
+
+# Pool partagé par les contrôleurs du processus
+opcua_sessions = OPCUASessionPool()
+atexit.register(opcua_sessions.close)
+
+# node_ids : NodeIdCache validé pour la session de client (par défaut celui du pool partagé)
+
+async def _pressure_node(client, node_ids=None):
+    return await (node_ids or opcua_sessions.node_ids).node(client, "vPLC", "pression")
+
+async def _read_pressure(client, node_ids=None):
+    myvar = await _pressure_node(client, node_ids)
+    return await myvar.get_value()
 
 async def get_pressure():
     """
     Récupère la valeur de la pression à partir du serveur OPC-UA.
     """
-    async with Client(url=OPC_UA_URL) as client:
-        namespace_idx = await client.get_namespace_index(NAMESPACE)
-        myvar = await client.nodes.root.get_child([
-            "0:Objects", 
-            "{}:vPLC".format(namespace_idx), 
-            "{}:pression".format(namespace_idx)
-        ])
-        pressure_value = await myvar.get_value()
-        return pressure_value
+    return await opcua_sessions.call(_read_pressure)
+
+def read_pressure():
+    """
+    Récupère la valeur de la pression depuis du code synchrone (contrôleurs des robots).
+    """
+    return opcua_sessions.call_sync(_read_pressure)
+
+async def _read_pressure_history(client, start, end):
+    myvar = await _pressure_node(client)
+    return await myvar.read_raw_history(start, end)
+
+async def get_pressure_history(start, end):
+    """
+    Récupère en un appel (HistoryRead) les échantillons de pression enregistrés par le serveur
+    entre start et end (datetime UTC) : liste de (horodatage, valeur).
+    """
+    values = await opcua_sessions.call(_read_pressure_history, start, end)
+    return [(value.SourceTimestamp, value.Value.Value) for value in values]
+
+def read_pressure_history(start, end):
+    """
+    Version synchrone de get_pressure_history(), par exemple pour analyser une prise ratée.
+    """
+    values = opcua_sessions.call_sync(_read_pressure_history, start, end)
+    return [(value.SourceTimestamp, value.Value.Value) for value in values]
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class PressureMonitor:
+    """
+    Abonnement OPC-UA (data change) à la variable 'pression' du vPLC, avec la dernière valeur
+    reçue gardée en cache (valeur et instant de réception, time.monotonic()).
+
+    read() répond depuis le cache sans requête au serveur ; read(newer_than=t) n'accepte qu'un
+    échantillon reçu après l'instant t (par exemple l'envoi de la commande de prise) et l'attend
+    au plus FRESH_SAMPLE_TIMEOUT. Le serveur ne publiant que les changements, None signifie que
+    la pression n'a pas changé depuis t. Tant que l'abonnement n'est pas établi, read() lit la
+    variable directement.
+
+    L'abonnement a sa propre session, rouverte (et l'abonnement recréé) si elle est perdue.
+    """
+    def __init__(self, pool, period=SUBSCRIPTION_PERIOD):
+        self.pool = pool
+        self.period = period
+        self._condition = threading.Condition()
+        self._value = None
+        self._received = None
+        self._future = None
+        # (boucle, futur) des coroutines attendant un échantillon, voir get()
+        self._waiters = []
+
+    def start(self):
+        """
+        Démarre l'abonnement (sans effet s'il est déjà démarré).
+        """
+        with self._condition:
+            if self._future is None or self._future.done():
+                self._future = self.pool.submit(self._supervise())
+
+    def stop(self):
+        with self._condition:
+            future, self._future = self._future, None
+        if future is not None:
+            future.cancel()
+
+    def datachange_notification(self, node, val, data):
+        # Appelé par asyncua dans la boucle du pool à chaque échantillon publié
+        with self._condition:
+            self._value = val
+            self._received = time.monotonic()
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    def _forget(self):
+        # La valeur n'est plus tenue à jour : ne plus la servir
+        with self._condition:
+            self._value = None
+            self._received = None
+
+    async def _supervise(self):
+        while True:
+            client = None
+            try:
+                client = await self.pool._connect()
+                node = await self.pool.node_ids.node(client, "vPLC", "pression")
+                subscription = await client.create_subscription(self.period, self)
+                await subscription.subscribe_data_change(node)
+                while True:
+                    await asyncio.sleep(KEEPALIVE_INTERVAL)
+                    await client.check_connection()
+            except Exception as e:
+                logger.debug("Pressure subscription lost (%s), reconnecting", e)
+            finally:
+                self._forget()
+                if client is not None:
+                    await self.pool._disconnect(client)
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def latest(self):
+        """
+        Retourne (valeur, instant de réception) du dernier échantillon, (None, None) sans abonnement.
+        """
+        with self._condition:
+            return self._value, self._received
+
+    def _fresh(self, newer_than):
+        # Appelé sous self._condition : la valeur en cache a été reçue après newer_than
+        return self._received is not None and self._received > newer_than
+
+    def _ready(self, newer_than, accept):
+        # Appelé sous self._condition : l'attente peut s'arrêter
+        return self._fresh(newer_than) and (accept is None or accept(self._value))
+
+    def _result(self, newer_than):
+        # Appelé sous self._condition après l'attente : (servi depuis le cache, valeur)
+        if self._received is None:
+            return False, None
+        if newer_than is not None and not self._fresh(newer_than):
+            return True, None
+        return True, self._value
+
+    def read(self, newer_than=None, timeout=FRESH_SAMPLE_TIMEOUT, accept=None):
+        """
+        Retourne la pression, depuis le cache de l'abonnement. Avec newer_than, retourne le
+        dernier échantillon reçu après cet instant, ou None s'il n'en arrive aucun avant timeout ;
+        accept(valeur) -> bool prolonge l'attente tant que les échantillons reçus ne le
+        satisfont pas (par exemple une pression qui monte pendant la prise).
+        """
+        self.start()
+        with self._condition:
+            if newer_than is not None:
+                self._condition.wait_for(lambda: self._ready(newer_than, accept), timeout)
+            cached, value = self._result(newer_than)
+        if cached:
+            return value
+        return read_pressure()
+
+    async def get(self, newer_than=None, timeout=FRESH_SAMPLE_TIMEOUT, accept=None):
+        """
+        Version asynchrone de read() : l'attente d'un échantillon frais ne bloque ni la boucle
+        ni un thread.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while newer_than is not None:
+            with self._condition:
+                if self._ready(newer_than, accept):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                break
+        with self._condition:
+            cached, value = self._result(newer_than)
+        if cached:
+            return value
+        return await get_pressure()
+
+# Abonnement partagé par les contrôleurs du processus (arrêté avant la fermeture du pool)
+pressure_monitor = PressureMonitor(opcua_sessions)
+atexit.register(pressure_monitor.stop)
+
+def asset_name(file_path):
+    """
+    Nom de l'objet d'un actif sous vPLC : le nom de son fichier AAS sans extension.
+    """
+    return os.path.basename(file_path).split('.', 1)[0]
+
+class StatePublisher:
+    """
+    Publie l'état opérationnel des robots dans la variable 'vPLC/<actif>/OperationalState' du
+    serveur, sans bloquer le contrôleur. Les écritures d'un même actif sont ordonnées et
+    regroupées : seul le dernier état demandé est écrit, et une seule écriture par actif attend
+    une session. Une écriture qui échoue (serveur injoignable) est abandonnée, la transition
+    suivante est publiée normalement.
+
+    Par défaut le publieur a son propre pool d'une session : un serveur injoignable retarde les
+    publications, pas les lectures de pression de opcua_sessions. Les contrôleurs ne publient
+    que si l'application leur donne un publieur (AASServiceInterface.state_publisher).
+    """
+    def __init__(self, pool=None):
+        self.pool = pool if pool is not None else OPCUASessionPool(size=1)
+        self._pending = {}
+        # Actifs dont l'écriture est lancée mais pas encore commencée
+        self._scheduled = set()
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def publish(self, file_path, state):
+        asset = asset_name(file_path)
+        with self._lock:
+            self._pending[asset] = state
+            if asset in self._scheduled:
+                return
+            self._scheduled.add(asset)
+        future = self.pool.call_soon(self._write, asset)
+        future.add_done_callback(lambda future: self._done(asset, future))
+
+    def _done(self, asset, future):
+        # Session impossible à ouvrir : l'état en attente est abandonné
+        if future.cancelled() or future.exception() is not None:
+            with self._lock:
+                if asset in self._scheduled:
+                    self._scheduled.discard(asset)
+                    self._pending.pop(asset, None)
+
+    async def _write(self, client, asset):
+        lock = self._locks.setdefault(asset, asyncio.Lock())
+        async with lock:
+            with self._lock:
+                self._scheduled.discard(asset)
+                state = self._pending.pop(asset, None)
+            if state is None:
+                return
+            state_node = await self.pool.node_ids.node(client, "vPLC", asset, "OperationalState")
+            await state_node.write_value(ua.Variant(state, ua.VariantType.String))
+
+    def close(self):
+        self.pool.close()
+
+# Publication des états des robots, à donner aux contrôleurs (voir async_services.robot_cell)
+state_publisher = StatePublisher()
+atexit.register(state_publisher.close)
+
+async def _download_file(client, file_name, path, node_ids=None):
+    """
+    Copie l'objet fichier file_name du serveur dans path, bloc par bloc (Open/Read/Close).
+    """
+    node_ids = node_ids or opcua_sessions.node_ids
+    file_object = await node_ids.node(client, "vPLC", file_name)
+    methods = {}
+    for name in ("Open", "Read", "Close"):
+        methods[name] = (await node_ids.node(client, "vPLC", file_name, "0:" + name)).nodeid
+    handle = await file_object.call_method(methods["Open"], ua.Variant(FILE_MODE_READ, ua.VariantType.Byte))
+    handle = ua.Variant(handle, ua.VariantType.UInt32)
+
+    async def chunks():
+        while True:
+            data = await file_object.call_method(
+                methods["Read"], handle, ua.Variant(FILE_CHUNK_SIZE, ua.VariantType.Int32))
+            if not data:
+                return
+            yield data
+
+    try:
+        # Fichier AAS des contrôleurs : remplacé sous leur verrou
+        await _write_file_atomic(path, chunks(), locked=True)
+    finally:
+        try:
+            await file_object.call_method(methods["Close"], handle)
+        except (ua.UaStatusCodeError, *CONNECTION_ERRORS) as e:
+            logger.debug("Could not close %s on the server: %s", file_name, e)
+
+async def _read_aasx_hash(client, file_name):
+    try:
+        hash_node = await opcua_sessions.node_ids.node(client, "vPLC", file_name + HASH_SUFFIX)
+        return await hash_node.get_value()
+    except ua.UaStatusCodeError:
+        # Serveur sans hash publié : le fichier est toujours téléchargé
+        return None
+
+async def _content(data):
+    yield data
+
+def _replace_locked(tmp_path, path):
+    # Prend le verrou d'écriture du dépôt AAS (aas_repository.FileLock) : le fichier n'est pas
+    # remplacé pendant l'écriture d'un état ou d'une configuration par un contrôleur
+    with FileLock(resolve_path(path)):
+        os.replace(tmp_path, path)
+
+async def _write_file_atomic(path, chunks, locked=False):
+    # chunks : itérateur asynchrone des blocs du fichier ; locked : renommage sous FileLock
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            async for chunk in chunks:
+                await f.write(chunk)
+            await f.flush()
+            os.fsync(f.fileno())
+        if locked:
+            # Le verrou est bloquant (flock) : pris hors de la boucle
+            await asyncio.to_thread(_replace_locked, tmp_path, path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
 async def get_aasx_file(file_name):
     """
     Télécharge un fichier AASX à partir du serveur OPC-UA.
     """
-    async with Client(url=OPC_UA_URL) as client:
-        namespace_idx = await client.get_namespace_index(NAMESPACE)
-        aasx_node = await client.nodes.root.get_child([
-            "0:Objects",
-            "{}:vPLC".format(namespace_idx),
-            "{}:{}".format(namespace_idx, file_name)
-        ])
-        file_content = await aasx_node.get_value()
-        
-        async with aiofiles.open(os.path.join(CLIENT_FILE_PATH, file_name), 'wb') as f:
-            await f.write(file_content)
+    await opcua_sessions.call(_download_file, file_name, os.path.join(CLIENT_FILE_PATH, file_name))
+
+def _read_manifest():
+    try:
+        with open(SYNC_MANIFEST) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+async def _sync_file(client, file_name, manifest):
+    path = os.path.join(CLIENT_FILE_PATH, file_name)
+    server_hash = await _read_aasx_hash(client, file_name)
+    if server_hash is not None and manifest.get(file_name) == server_hash and os.path.exists(path):
+        return "unchanged"
+    await _download_file(client, file_name, path)
+    if server_hash is None:
+        manifest.pop(file_name, None)
+    else:
+        manifest[file_name] = server_hash
+    return "updated"
+
+async def _sync_files(client, file_names):
+    manifest = _read_manifest()
+    results = await asyncio.gather(*(_sync_file(client, name, manifest) for name in file_names))
+    await _write_file_atomic(SYNC_MANIFEST, _content(json.dumps(manifest, indent=2).encode()))
+    return dict(zip(file_names, results))
+
+async def sync_aasx_files(file_names=AASX_FILES):
+    """
+    Synchronise les fichiers AASX avec le serveur OPC-UA : les fichiers sont traités en parallèle
+    sur une même session, et seuls ceux dont le hash publié par le serveur diffère de celui du
+    dernier téléchargement (ou absents localement) sont transférés. Retourne, pour chaque
+    fichier, "updated" ou "unchanged".
+    """
+    os.makedirs(CLIENT_FILE_PATH, exist_ok=True)
+    return await opcua_sessions.call(_sync_files, list(file_names))
 
 async def main():
     await get_pressure()
 
-    for file_name in AASX_FILES:
-        await get_aasx_file(file_name)
+    results = await sync_aasx_files()
+    for file_name, status in results.items():
+        print(f"{file_name}: {status}")
     print("Files imported successfully.")
 
 if __name__ == "__main__":
@@ -0,0 +1,183 @@
+"""
+In-memory history of OPC UA variables for Server.py.
+
+RingBufferHistory is an asyncua history storage keeping, per historized variable, the last
+'capacity' samples (source timestamp, value) in a fixed-size NumPy ring buffer, and serving
+HistoryRead (raw) from it. With a spill path, the samples are also appended periodically to a
+compact binary file (SAMPLE_DTYPE records, see load_spill()) so the trace outlives the buffer.
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import numpy as np
+from asyncua import ua
+from asyncua.server.history import HistoryStorageInterface
+
+# One sample: source timestamp (seconds since the Unix epoch, UTC) and value
+SAMPLE_DTYPE = np.dtype([('t', '<f8'), ('v', '<f8')])
+DEFAULT_CAPACITY = 100000
+SPILL_INTERVAL = 10.0  # s
+
+
+def _to_seconds(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _to_datetime(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+class SampleRing:
+    """
+    Fixed-size ring of samples; once full, each new sample overwrites the oldest one.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._samples = np.zeros(capacity, dtype=SAMPLE_DTYPE)
+        self._next = 0
+        # Samples ever appended, to know what is left to spill
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, t, v):
+        self._samples[self._next] = (t, v)
+        self._next = (self._next + 1) % self.capacity
+        self.total += 1
+
+    def ordered(self):
+        """
+        Returns the samples, oldest first.
+        """
+        if self.total < self.capacity:
+            return self._samples[:self._next]
+        return np.concatenate((self._samples[self._next:], self._samples[:self._next]))
+
+    def last(self, count):
+        count = min(count, len(self))
+        return self.ordered()[len(self) - count:]
+
+
+def load_spill(path):
+    """
+    Reads a spill file back as a NumPy array of SAMPLE_DTYPE records.
+    """
+    return np.fromfile(path, dtype=SAMPLE_DTYPE)
+
+
+class RingBufferHistory(HistoryStorageInterface):
+    """
+    asyncua history storage backed by one SampleRing per historized variable. Values are stored
+    as float64 (numeric variables such as 'pression'). Events are not historized.
+
+        history = RingBufferHistory(spill_path="~/Desktop/pressure_history.bin")
+        server.iserver.history_manager.set_storage(history)
+        await server.historize_node_data_change(press_var, period=None, count=100000)
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, spill_path=None, spill_interval=SPILL_INTERVAL):
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.spill_interval = spill_interval
+        self._rings = {}
+        self._spilled = {}
+        self._spill_task = None
+
+    async def init(self):
+        if self.spill_path is not None:
+            self._spill_task = asyncio.get_running_loop().create_task(self._spill_periodically())
+
+    async def new_historized_node(self, node_id, period, count=0):
+        self._rings[node_id] = SampleRing(count or self.capacity)
+        self._spilled[node_id] = 0
+
+    async def save_node_value(self, node_id, datavalue):
+        ring = self._rings.get(node_id)
+        if ring is None or datavalue.Value is None or datavalue.Value.Value is None:
+            return
+        timestamp = datavalue.SourceTimestamp or datavalue.ServerTimestamp or datetime.now(timezone.utc)
+        ring.append(_to_seconds(timestamp), float(datavalue.Value.Value))
+
+    async def read_node_history(self, node_id, start, end, nb_values):
+        """
+        Raw history between start and end, following the conventions of asyncua's HistoryDict:
+        an unset start (or end) reads from the newest (or up to the newest) sample, start later
+        than end returns the samples newest first, and at most nb_values samples are returned
+        with the timestamp of the next one as continuation point.
+        """
+        ring = self._rings.get(node_id)
+        if ring is None:
+            return [], None
+        samples = ring.ordered()
+        epoch = ua.get_win_epoch()
+        if start is None:
+            start = epoch
+        if end is None:
+            end = epoch
+        times = samples['t']
+        if start == epoch:
+            selected = samples[::-1]
+            if end != epoch:
+                selected = selected[selected['t'] >= _to_seconds(end)]
+        elif end == epoch:
+            selected = samples[np.searchsorted(times, _to_seconds(start), side='left'):]
+        elif start > end:
+            first = np.searchsorted(times, _to_seconds(end), side='left')
+            last = np.searchsorted(times, _to_seconds(start), side='right')
+            selected = samples[first:last][::-1]
+        else:
+            first = np.searchsorted(times, _to_seconds(start), side='left')
+            last = np.searchsorted(times, _to_seconds(end), side='right')
+            selected = samples[first:last]
+
+        cont = None
+        if nb_values and len(selected) > nb_values:
+            cont = _to_datetime(selected['t'][nb_values])
+            selected = selected[:nb_values]
+        results = []
+        for t, v in selected:
+            timestamp = _to_datetime(t)
+            results.append(ua.DataValue(ua.Variant(float(v), ua.VariantType.Double),
+                                        SourceTimestamp=timestamp, ServerTimestamp=timestamp))
+        return results, cont
+
+    async def new_historized_event(self, source_id, evtypes, period, count=0):
+        pass
+
+    async def save_event(self, event):
+        pass
+
+    async def read_event_history(self, source_id, start, end, nb_values, evfilter):
+        return [], None
+
+    def spill(self):
+        """
+        Appends the samples received since the last spill to the spill file. Samples overwritten
+        in the ring before being spilled are lost.
+        """
+        new = []
+        for node_id, ring in self._rings.items():
+            pending = ring.total - self._spilled[node_id]
+            if pending:
+                new.append(ring.last(pending))
+                self._spilled[node_id] = ring.total
+        if new:
+            with open(self.spill_path, 'ab') as f:
+                np.concatenate(new).tofile(f)
+
+    async def _spill_periodically(self):
+        while True:
+            await asyncio.sleep(self.spill_interval)
+            try:
+                self.spill()
+            except OSError as e:
+                print(f"Could not spill the history to {self.spill_path}: {e}")
+
+    async def stop(self):
+        if self._spill_task is not None:
+            self._spill_task.cancel()
+            self._spill_task = None
+            self.spill()
@@ -0,0 +1,143 @@
+"""
+Asynchronous job queues executing AAS services on the robot controllers.
+
+Each robot has a RobotJobQueue: jobs are submitted from the event loop (e.g. by the OPC UA methods
+of Server.py), get an id at once, and are executed one at a time, in submission order, by a
+dedicated worker thread calling the controller method mapped to the service. The controller is
+created on the first job, so the queue can exist while the robot is offline.
+"""
+
+import asyncio
+import importlib
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# AAS service -> controller method, per asset (the asset being named after its AAS file)
+ROBOT_SERVICES = {
+    "NiryoNed2AAS": {
+        "controller": "NiRyo_ChaikMat_Ecosyspro.ChaikNiRyo",
+        "setup": "setup",
+        "services": {
+            "Pick": "load_piece",
+            "Place": "put_back_piece",
+            "Convey": "convey_until_detect",
+            "ColorAndShapeDetection": "pick_my_thing",
+        },
+    },
+    "WlkataMirobotAAS": {
+        "controller": "ChaikmatWLKATA.ChaikWLKATA",
+        "setup": None,
+        "services": {
+            "Pick": "pick",
+            "Place": "release_to_Ned",
+            "Move": "move_conveyor",
+        },
+    },
+}
+
+QUEUED = "Queued"
+RUNNING = "Running"
+SUCCEEDED = "Succeeded"
+FAILED = "Failed"
+
+_job_ids = itertools.count(1)
+
+
+class Job:
+    """
+    One service call: its arguments, status, and result or error once finished.
+    """
+    def __init__(self, robot, service, args):
+        self.id = next(_job_ids)
+        self.robot = robot
+        self.service = service
+        self.args = list(args)
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+
+def controller_factory(controller, setup=None, state_publisher=None):
+    """
+    Returns a function creating the controller 'module.Class' (and calling its setup method),
+    its state transitions published with state_publisher. The module is only imported when the
+    first job runs.
+    """
+    def create():
+        module_name, class_name = controller.rsplit('.', 1)
+        instance = getattr(importlib.import_module(module_name), class_name)()
+        instance.state_publisher = state_publisher
+        if setup:
+            getattr(instance, setup)()
+        return instance
+    return create
+
+
+class RobotJobQueue:
+    """
+    FIFO of jobs for one robot. submit() is called from the event loop and returns the Job at
+    once (or job() creates it and put() queues it, e.g. once its status can be published); run()
+    is the worker coroutine executing the jobs in the robot's thread. on_change, an optional
+    coroutine function, is awaited with the job at each status change.
+    """
+    def __init__(self, robot, factory, services, on_change=None):
+        self.robot = robot
+        self.factory = factory
+        self.services = services
+        self.on_change = on_change
+        self.controller = None
+        self._queue = asyncio.Queue()
+        # One thread: the robot executes one motion at a time
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"jobs-{robot}")
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def job(self, service, args=()):
+        if service not in self.services:
+            raise KeyError(f"The '{service}' service has no driver on {self.robot}.")
+        return Job(self.robot, service, args)
+
+    def put(self, job):
+        self._queue.put_nowait(job)
+        return job
+
+    def submit(self, service, args=()):
+        return self.put(self.job(service, args))
+
+    def _execute(self, job):
+        if self.controller is None:
+            self.controller = self.factory()
+        return getattr(self.controller, self.services[job.service])(*job.args)
+
+    async def _changed(self, job):
+        if self.on_change is not None:
+            try:
+                await self.on_change(job)
+            except Exception as e:
+                print(f"Could not publish the status of job {job.id}: {e}")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            job.status = RUNNING
+            job.started = time.time()
+            await self._changed(job)
+            try:
+                job.result = await loop.run_in_executor(self._executor, self._execute, job)
+                # The service methods of the controllers return True on success and False on
+                # failure; any other false result (None, 0) is a failure too
+                job.status = SUCCEEDED if job.result else FAILED
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = FAILED
+            job.finished = time.time()
+            await self._changed(job)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,102 @@
+"""
+Waiting for a digital input of a robot to change, e.g. the IR sensor of the conveyor.
+
+pyniryo's TCP API does not notify input changes, so EdgeWaiter polls: at SLOW_INTERVAL while the
+edge is not expected yet, then every FAST_INTERVAL (in practice one read per round trip to the
+robot) from FAST_WINDOW seconds before the expected instant. When that instant is unknown, reads
+are BLIND_INTERVAL apart for the whole wait, rather than keeping the robot's connection busy. The
+edge lies between the last read in the old state and the first read in the new one; the width of
+that bracket, the worst-case detection latency, is recorded in a LatencyHistogram.
+"""
+
+import bisect
+import time
+
+SLOW_INTERVAL = 0.1  # s
+FAST_WINDOW = 0.3  # s
+# Minimum time between the starts of two reads, near the expected edge and when it is unknown
+FAST_INTERVAL = 0.005  # s
+BLIND_INTERVAL = 0.02  # s
+# Upper bounds (ms) of the latency histogram buckets, the last bucket collecting the rest
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class LatencyHistogram:
+    """
+    Counts of the detection latencies per bucket, with their mean and maximum.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, latency):
+        latency_ms = latency * 1000
+        self.counts[bisect.bisect_left(self.buckets, latency_ms)] += 1
+        self.count += 1
+        self.total += latency_ms
+        self.max = max(self.max, latency_ms)
+
+    def summary(self):
+        labels = [f"<= {bound} ms" for bound in self.buckets] + [f"> {self.buckets[-1]} ms"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "max_ms": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+    def __str__(self):
+        summary = self.summary()
+        lines = [f"Detections: {summary['count']}, mean latency: {summary['mean_ms']} ms, max: {summary['max_ms']} ms"]
+        lines += [f"  {label:>10}: {count}" for label, count in summary["buckets"].items()]
+        return "\n".join(lines)
+
+
+class EdgeWaiter:
+    """
+    Waits for read() to return level. read is the blocking read of the input, e.g.
+    lambda: robot.digital_read(PinID.DI5).
+    """
+    def __init__(self, read, level, slow_interval=SLOW_INTERVAL, fast_window=FAST_WINDOW,
+                 fast_interval=FAST_INTERVAL, blind_interval=BLIND_INTERVAL, histogram=None):
+        self.read = read
+        self.level = level
+        self.slow_interval = slow_interval
+        self.fast_window = fast_window
+        self.fast_interval = fast_interval
+        self.blind_interval = blind_interval
+        self.histogram = histogram if histogram is not None else LatencyHistogram()
+
+    def wait(self, timeout=None, expected=None):
+        """
+        Returns True as soon as the input is at level, False after timeout seconds (None: no
+        limit). expected is the number of seconds after which the edge is expected, if known.
+        """
+        start = time.perf_counter()
+        deadline = start + timeout if timeout is not None else None
+        fast_from = start + expected - self.fast_window if expected is not None else start
+        fast_interval = self.fast_interval if expected is not None else self.blind_interval
+        # Start of the last read in the old state: the edge happened after it
+        previous = None
+        while True:
+            read_start = time.perf_counter()
+            state = self.read()
+            now = time.perf_counter()
+            if state == self.level:
+                if previous is not None:
+                    self.histogram.record(now - previous)
+                return True
+            previous = read_start
+            if deadline is not None and now >= deadline:
+                return False
+            if now < fast_from:
+                pause = min(self.slow_interval, fast_from - now)
+            else:
+                pause = read_start + fast_interval - now
+            if deadline is not None:
+                pause = min(pause, deadline - now)
+            if pause > 0:
+                time.sleep(pause)
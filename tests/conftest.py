@@ -0,0 +1,43 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# The modules of the repository are flat scripts at its root
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture
+def ned_aas_xml(tmp_path):
+    """
+    Copy of the Ned AAS environment in a temporary directory.
+    """
+    path = tmp_path / "NiryoNed2AAS.aas.xml"
+    shutil.copyfile(os.path.join(REPO_DIR, "NiryoNed2AAS.aas.xml"), path)
+    return str(path)
+
+
+@pytest.fixture
+def ned_aasx(tmp_path):
+    """
+    Copy of the Ned AASX package in a temporary directory.
+    """
+    path = tmp_path / "NiryoNed2AAS.aasx"
+    shutil.copyfile(os.path.join(REPO_DIR, "NiryoNed2AAS.aasx"), path)
+    return str(path)
+
+
+@pytest.fixture
+def aas_cache(monkeypatch):
+    """
+    Fresh document cache installed as the shared cache of aas_repository, its write-behind
+    timer cancelled at the end of the test.
+    """
+    import aas_repository
+    cache = aas_repository.AASDocumentCache()
+    monkeypatch.setattr(aas_repository, "aas_cache", cache)
+    yield cache
+    if cache._persist_timer is not None:
+        cache._persist_timer.cancel()
@@ -0,0 +1,136 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+import aas_repository
+from aas_repository import (AASDocumentCache, AASError, AASTransaction, FileLock, parse_document, read_version,
+                            resolve_path)
+from aasx_package import AASXPackage, replace_spec
+
+
+def _document(path):
+    root = parse_document(path).getroot()
+    return (aas_repository.OperationalStates.from_root(root).current,
+            aas_repository.build_service_index(root), aas_repository.tree_version(root))
+
+
+def _without_service(path, service_name, target):
+    """
+    Writes to target a copy of the AAS file at path without service_name and without a version
+    bump, as a package downloaded from the server would be.
+    """
+    shutil.copyfile(path, target)
+    tree = parse_document(path)
+    aas_repository.apply_operation(tree.getroot(), {'op': 'remove_service', 'service': service_name})
+    aas_repository._atomic_write(tree, target)
+
+
+def _replace_locked(tmp_path, path):
+    # Same as client._replace_locked: a sync swaps the file under the repository lock
+    with FileLock(resolve_path(path)):
+        os.replace(tmp_path, path)
+
+
+@pytest.fixture(params=["xml", "aasx"])
+def aas_file(request, ned_aas_xml, ned_aasx):
+    return ned_aas_xml if request.param == "xml" else ned_aasx
+
+
+def test_writers_of_two_processes_are_merged(aas_file):
+    # One cache per process
+    first, second = AASDocumentCache(), AASDocumentCache()
+    first.get(aas_file)
+    second.set_state(aas_file, "Active")
+
+    first.commit(aas_file, [{'op': 'remove_service', 'service': 'Convey'}])
+    second.flush()
+
+    state, services, version = _document(aas_file)
+    assert state == "Active"
+    assert "Convey" not in services
+    assert version == read_version(aas_file) == 2
+
+
+@pytest.mark.parametrize("parsed", [True, False])
+def test_file_replaced_without_version_bump(aas_file, aas_cache, tmp_path, parsed):
+    if parsed:
+        # Loaded by a controller (load_shell)
+        aas_cache.get(aas_file).tree
+    aas_cache.set_state(aas_file, "Active")
+    name = os.path.basename(aas_file)
+    download = str(tmp_path / ("download." + name))
+    _without_service(aas_file, "Convey", download)
+    assert read_version(download) == read_version(aas_file) == 0
+
+    _replace_locked(download, aas_file)
+    aas_cache.flush()
+
+    state, services, version = _document(aas_file)
+    assert state == "Active"
+    assert "Convey" not in services
+    assert version == 1
+    assert "Convey" not in aas_cache.get(aas_file).services
+
+
+def test_transaction_after_replaced_file(aas_file, aas_cache, tmp_path):
+    aas_cache.get(aas_file).tree
+    download = str(tmp_path / ("download." + os.path.basename(aas_file)))
+    _without_service(aas_file, "Move", download)
+    _replace_locked(download, aas_file)
+
+    with AASTransaction(aas_file) as transaction:
+        transaction.remove_service("Convey")
+
+    _, services, _ = _document(aas_file)
+    assert "Move" not in services and "Convey" not in services
+
+
+def test_conflicting_change_is_rejected(ned_aas_xml):
+    first, second = AASDocumentCache(), AASDocumentCache()
+    second.get(ned_aas_xml).tree
+
+    first.commit(ned_aas_xml, [{'op': 'remove_service', 'service': 'Pick'}])
+    with pytest.raises(AASError):
+        second.commit(ned_aas_xml, [{'op': 'configure_service', 'service': 'Pick',
+                                     'properties': {'DriverFunction': 'vpick()'}}])
+
+    _, services, version = _document(ned_aas_xml)
+    assert "Pick" not in services
+    assert version == 1
+
+
+def test_concurrent_commits_lose_nothing(ned_aas_xml):
+    caches = [AASDocumentCache() for _ in range(4)]
+    for cache in caches:
+        cache.get(ned_aas_xml).tree
+
+    def add(cache, index):
+        for step in range(5):
+            cache.commit(ned_aas_xml, [{'op': 'add_service', 'service': f'S{index}_{step}', 'properties': {
+                'Input': 'NULL', 'Output': 'NULL', 'DriverFunction': 'f()', 'Effector': 'None'}}])
+
+    threads = [threading.Thread(target=add, args=(cache, index)) for index, cache in enumerate(caches)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    _, services, version = _document(ned_aas_xml)
+    assert {f'S{index}_{step}' for index in range(4) for step in range(5)} <= set(services)
+    assert version == 20
+
+
+def test_compact_after_replaced_file(ned_aas_xml, aas_cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(aas_repository, "JOURNAL_MODE", True)
+    aas_cache.set_state(ned_aas_xml, "Error")
+    download = str(tmp_path / "download.aas.xml")
+    _without_service(ned_aas_xml, "Convey", download)
+    _replace_locked(download, ned_aas_xml)
+
+    aas_cache.compact(ned_aas_xml)
+
+    state, services, _ = _document(ned_aas_xml)
+    assert state == "Error"
+    assert "Convey" not in services
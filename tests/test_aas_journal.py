@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+
+import aas_repository
+from aas_repository import (AASDocumentCache, AASTransaction, journal_path, parse_document, query_service,
+                            read_version, set_robot_state)
+
+
+@pytest.fixture(autouse=True)
+def journal_mode(monkeypatch):
+    monkeypatch.setattr(aas_repository, "JOURNAL_MODE", True)
+    monkeypatch.setattr(aas_repository, "JOURNAL_MAX_BYTES", 64 * 1024)
+    monkeypatch.setattr(aas_repository, "JOURNAL_MAX_AGE", 600.0)
+
+
+def _journal_lines(path):
+    with open(journal_path(path), 'rb') as f:
+        return [json.loads(line) for line in f.read().splitlines()]
+
+
+def _state(path, cache=None):
+    # What another process sees: a new cache reading the XML with its journal replayed
+    return (cache or AASDocumentCache()).get(path).states.current
+
+
+def test_state_changes_are_appended(ned_aas_xml, aas_cache):
+    with open(ned_aas_xml, 'rb') as f:
+        before = f.read()
+
+    set_robot_state(ned_aas_xml, "Active")
+    aas_cache.flush()
+    set_robot_state(ned_aas_xml, "Idle")
+    aas_cache.flush()
+
+    with open(ned_aas_xml, 'rb') as f:
+        assert f.read() == before
+    header, *records = _journal_lines(ned_aas_xml)
+    assert header['base'] == list(aas_repository._file_stamp(ned_aas_xml))
+    assert [record['ops'] for record in records] == [[{'op': 'set_state', 'state': 'Active'}],
+                                                    [{'op': 'set_state', 'state': 'Idle'}]]
+    assert [record['v'] for record in records] == [1, 2]
+    assert read_version(ned_aas_xml) == 2
+    assert _state(ned_aas_xml) == "Idle"
+
+
+def test_transaction_is_one_record(ned_aas_xml, aas_cache):
+    with AASTransaction(ned_aas_xml) as transaction:
+        transaction.remove_service("Convey")
+        transaction.add_service("ConveyFast", "NULL", "0/1", "convey_until_detect()", "Conveyor")
+
+    header, record = _journal_lines(ned_aas_xml)
+    assert [operation['op'] for operation in record['ops']] == ['remove_service', 'add_service']
+    services = AASDocumentCache().get(ned_aas_xml).services
+    assert "Convey" not in services and "ConveyFast" in services
+
+
+def test_compact_rebuilds_the_xml(ned_aas_xml, aas_cache):
+    set_robot_state(ned_aas_xml, "Active")
+    aas_cache.flush()
+    with AASTransaction(ned_aas_xml) as transaction:
+        transaction.remove_service("Move")
+
+    aas_cache.compact(ned_aas_xml)
+
+    assert not os.path.exists(journal_path(ned_aas_xml))
+    root = parse_document(ned_aas_xml).getroot()
+    assert aas_repository.tree_version(root) == 3
+    assert aas_repository.OperationalStates.from_root(root).current == "Active"
+    assert "Move" not in aas_repository.build_service_index(root)
+    assert read_version(ned_aas_xml) == 3
+
+
+def test_compaction_threshold(ned_aas_xml, aas_cache, monkeypatch):
+    monkeypatch.setattr(aas_repository, "JOURNAL_MAX_BYTES", 0)
+
+    set_robot_state(ned_aas_xml, "Error")
+    aas_cache.flush()
+
+    # The record (version 1) is compacted into the XML at once (version 2)
+    assert not os.path.exists(journal_path(ned_aas_xml))
+    assert _state(ned_aas_xml) == "Error"
+    assert read_version(ned_aas_xml) == 2
+
+
+def test_torn_last_record_is_dropped(ned_aas_xml, aas_cache):
+    set_robot_state(ned_aas_xml, "Active")
+    aas_cache.flush()
+    with open(journal_path(ned_aas_xml), 'ab') as f:
+        f.write(b'{"ts":1,"ops":[{"op":"set_st')
+
+    assert _state(ned_aas_xml) == "Active"
+    assert read_version(ned_aas_xml) == 1
+
+
+def test_journal_of_another_xml_is_ignored(ned_aas_xml, aas_cache):
+    set_robot_state(ned_aas_xml, "Active")
+    aas_cache.flush()
+    # The XML is replaced by another tool: the journal was written for the previous file
+    data = parse_document(ned_aas_xml)
+    aas_repository._atomic_write(data, ned_aas_xml)
+    os.utime(ned_aas_xml, ns=(1, 1))
+
+    # No state flag is set in the original document
+    assert _state(ned_aas_xml) is None
+    assert read_version(ned_aas_xml) == 0
+    query_service(ned_aas_xml, "Pick")
@@ -0,0 +1,85 @@
+import pytest
+
+import aas_repository
+from aas_repository import AASError, AASTransaction, parse_document, query_service, read_version
+
+
+def _services(path):
+    return aas_repository.build_service_index(parse_document(path).getroot())
+
+
+def _state(path):
+    return aas_repository.OperationalStates.from_root(parse_document(path).getroot()).current
+
+
+def test_commit_writes_every_operation_at_once(ned_aas_xml, aas_cache):
+    with AASTransaction(ned_aas_xml) as transaction:
+        transaction.remove_service("Convey")
+        transaction.add_service("ConveyFast", "NULL", "0/1", "convey_until_detect()", "Conveyor")
+        transaction.configure_service("Pick", "picking_angles", "0/1", "vpick()", "Gripper")
+
+    services = _services(ned_aas_xml)
+    assert "Convey" not in services
+    assert services["ConveyFast"] == ("ConveyFast", "convey_until_detect()", "NULL", "0/1", "Conveyor")
+    assert services["Pick"].driver_function == "vpick()"
+    assert read_version(ned_aas_xml) == 1
+    assert query_service(ned_aas_xml, "ConveyFast").effector == "Conveyor"
+
+
+def test_invalid_operation_fails_when_staged(ned_aas_xml, aas_cache):
+    with open(ned_aas_xml, 'rb') as f:
+        before = f.read()
+
+    with pytest.raises(AASError):
+        with AASTransaction(ned_aas_xml) as transaction:
+            transaction.remove_service("Convey")
+            transaction.configure_service("NoSuchService", "NULL", "NULL", "f()", "Gripper")
+
+    with open(ned_aas_xml, 'rb') as f:
+        assert f.read() == before
+    assert query_service(ned_aas_xml, "Convey").name == "Convey"
+
+
+def test_exception_rolls_back(ned_aas_xml, aas_cache):
+    with pytest.raises(RuntimeError):
+        with AASTransaction(ned_aas_xml) as transaction:
+            transaction.add_service("Weld", "NULL", "NULL", "weld()", "Torch")
+            raise RuntimeError("abort")
+
+    assert "Weld" not in _services(ned_aas_xml)
+    with pytest.raises(aas_repository.ServiceNotAvailable):
+        query_service(ned_aas_xml, "Weld")
+
+
+def test_add_existing_service_is_rejected(ned_aas_xml, aas_cache):
+    transaction = AASTransaction(ned_aas_xml)
+    with pytest.raises(AASError):
+        transaction.add_service("Pick", "NULL", "NULL", "pick()", "Gripper")
+    assert transaction.operations == []
+
+
+def test_commit_writes_pending_states_along(ned_aas_xml, aas_cache):
+    aas_repository.set_robot_state(ned_aas_xml, "Active")
+    with AASTransaction(ned_aas_xml) as transaction:
+        transaction.remove_service("Move")
+
+    assert _state(ned_aas_xml) == "Active"
+    assert "Move" not in _services(ned_aas_xml)
+    assert not aas_cache.get(ned_aas_xml).dirty
+
+
+def test_failed_write_leaves_file_and_cache(ned_aas_xml, aas_cache, monkeypatch):
+    with open(ned_aas_xml, 'rb') as f:
+        before = f.read()
+
+    def failing_write(tree, path):
+        raise OSError("disk full")
+    monkeypatch.setattr(aas_repository, "_atomic_write", failing_write)
+
+    with pytest.raises(AASError):
+        with AASTransaction(ned_aas_xml) as transaction:
+            transaction.remove_service("Pick")
+
+    with open(ned_aas_xml, 'rb') as f:
+        assert f.read() == before
+    assert query_service(ned_aas_xml, "Pick").name == "Pick"
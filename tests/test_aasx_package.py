@@ -0,0 +1,74 @@
+import zipfile
+
+import pytest
+
+import aasx_package
+from aasx_package import AASXPackage, replace_spec
+
+
+def _members(path):
+    with zipfile.ZipFile(path) as z:
+        return {info.filename: (info.CRC, info.file_size, info.compress_type, z.read(info))
+                for info in z.infolist()}
+
+
+@pytest.fixture(params=["raw", "recompressed", "raw failing"])
+def copy_mode(request, monkeypatch):
+    if request.param == "recompressed":
+        monkeypatch.setattr(aasx_package, "RAW_COPY", False)
+    elif request.param == "raw failing":
+        def broken(source, info):
+            raise OSError("truncated archive")
+        monkeypatch.setattr(aasx_package, "_read_raw", broken)
+    return request.param
+
+
+def test_replace_spec_round_trip(ned_aasx, copy_mode):
+    before = _members(ned_aasx)
+    with AASXPackage(ned_aasx) as package:
+        spec_name = package.spec_name
+        data = package.read_spec().replace(b'NiryoNed2AAS', b'NiryoNed2AASCopy')
+
+    replace_spec(ned_aasx, data)
+
+    with zipfile.ZipFile(ned_aasx) as z:
+        assert z.testzip() is None
+        assert z.namelist() == list(before)
+    after = _members(ned_aasx)
+    with AASXPackage(ned_aasx) as package:
+        assert package.spec_name == spec_name
+        assert package.read_spec() == data
+    assert after[spec_name][0] == zipfile.crc32(data)
+    for name, member in before.items():
+        if name != spec_name:
+            assert after[name] == member
+
+
+def test_replace_spec_keeps_raw_bytes(ned_aasx):
+    if not aasx_package.RAW_COPY:
+        pytest.skip("raw copy not supported by this interpreter")
+    with AASXPackage(ned_aasx) as package:
+        spec_name = package.spec_name
+    with open(ned_aasx, 'rb') as f, zipfile.ZipFile(ned_aasx) as z:
+        raw_before = {info.filename: aasx_package._read_raw(f, info) for info in z.infolist()}
+
+    replace_spec(ned_aasx, b'<environment/>')
+
+    with open(ned_aasx, 'rb') as f, zipfile.ZipFile(ned_aasx) as z:
+        for info in z.infolist():
+            if info.filename != spec_name:
+                assert aasx_package._read_raw(f, info) == raw_before[info.filename]
+
+
+def test_failed_rebuild_leaves_package(ned_aasx, tmp_path, monkeypatch):
+    before = _members(ned_aasx)
+
+    def broken(package, data, f):
+        raise OSError("disk full")
+    monkeypatch.setattr(aasx_package, "RAW_COPY", False)
+    monkeypatch.setattr(aasx_package, "_copy_recompressed", broken)
+
+    with pytest.raises(OSError):
+        replace_spec(ned_aasx, b'<environment/>')
+    assert _members(ned_aasx) == before
+    assert [p.name for p in tmp_path.iterdir()] == ["NiryoNed2AAS.aasx"]
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+Server = pytest.importorskip("Server")
+from asyncua import ua
+
+
+@pytest.fixture
+def handler(ned_aasx):
+    handler = Server.FileTypeHandler(ned_aasx, max_chunk_size=4096, handle_timeout=0.2)
+    yield handler
+    handler.close_all()
+
+
+def test_chunked_read(handler, ned_aasx):
+    handle = handler.open(None, Server.FILE_MODE_READ).Value
+    chunks = []
+    while True:
+        chunk = handler.read(None, handle, 1 << 20).Value
+        if not chunk:
+            break
+        assert len(chunk) <= 4096
+        chunks.append(chunk)
+    handler.close(None, handle)
+    with open(ned_aasx, 'rb') as f:
+        assert b''.join(chunks) == f.read()
+
+
+def test_idle_handles_expire(handler):
+    idle = handler.open(None, Server.FILE_MODE_READ).Value
+    active = handler.open(None, Server.FILE_MODE_READ).Value
+    for _ in range(3):
+        time.sleep(0.1)
+        handler.read(None, active, 16)
+    handler.expire()
+
+    with pytest.raises(ua.UaStatusCodeError):
+        handler.read(None, idle, 16)
+    assert handler.read(None, active, 16).Value
+    handler.close(None, active)
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+client = pytest.importorskip("client")
+
+
+class IdlePool:
+    # The subscription itself is not started: samples are pushed by the tests
+    def submit(self, coroutine):
+        coroutine.close()
+
+
+def _grip(value):
+    return value > 0.5
+
+
+@pytest.fixture
+def monitor():
+    monitor = client.PressureMonitor(IdlePool())
+    # Pressure before the grasp
+    monitor.datachange_notification(None, 0.9, None)
+    return monitor
+
+
+def _later(delay, monitor, value):
+    timer = threading.Timer(delay, monitor.datachange_notification, (None, value, None))
+    timer.start()
+    return timer
+
+
+def test_cached_value_before_the_grasp_is_not_accepted(monitor):
+    since = time.monotonic()
+    assert monitor.read(newer_than=since, timeout=0.1, accept=_grip) is None
+    assert monitor.read() == 0.9
+
+
+def test_waits_for_a_sample_showing_the_grip(monitor):
+    since = time.monotonic()
+    _later(0.02, monitor, 0.3)
+    _later(0.05, monitor, 0.8)
+    start = time.monotonic()
+    assert monitor.read(newer_than=since, timeout=2.0, accept=_grip) == 0.8
+    assert time.monotonic() - start < 1.0
+
+
+def test_fresh_sample_without_grip(monitor):
+    since = time.monotonic()
+    _later(0.02, monitor, 0.1)
+    assert monitor.read(newer_than=since, timeout=0.2, accept=_grip) == 0.1
+
+
+def test_async_get(monitor):
+    async def check():
+        loop = asyncio.get_running_loop()
+        since = time.monotonic()
+        loop.call_later(0.02, monitor.datachange_notification, None, 0.7, None)
+        assert await monitor.get(newer_than=since, timeout=2.0, accept=_grip) == 0.7
+        assert await monitor.get(newer_than=time.monotonic(), timeout=0.05) is None
+    asyncio.run(check())
@@ -0,0 +1,53 @@
+import time
+
+from sensor_wait import EdgeWaiter, LatencyHistogram
+
+
+class Input:
+    # Input going to level 1 rise seconds after its creation, counting the reads
+    def __init__(self, rise=None):
+        self.start = time.perf_counter()
+        self.rise = rise
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        if self.rise is not None and time.perf_counter() - self.start >= self.rise:
+            return 1
+        return 0
+
+
+def test_edge_detected_and_latency_recorded():
+    sensor = Input(rise=0.2)
+    histogram = LatencyHistogram()
+    assert EdgeWaiter(sensor.read, 1, histogram=histogram).wait(1.0, expected=0.2)
+    assert histogram.count == 1
+    assert histogram.max < 20
+
+
+def test_level_already_reached():
+    histogram = LatencyHistogram()
+    assert EdgeWaiter(Input(rise=0).read, 1, histogram=histogram).wait(1.0)
+    assert histogram.count == 0
+
+
+def test_timeout():
+    sensor = Input()
+    start = time.perf_counter()
+    assert not EdgeWaiter(sensor.read, 1).wait(0.2, expected=0.1)
+    assert 0.2 <= time.perf_counter() - start < 0.4
+
+
+def test_unknown_edge_not_polled_back_to_back():
+    sensor = Input()
+    assert not EdgeWaiter(sensor.read, 1, blind_interval=0.02).wait(0.5)
+    # About 25 reads, instead of one per loop iteration of a busy poll
+    assert sensor.reads <= 30
+
+
+def test_expected_edge_polled_fast_only_near_it():
+    sensor = Input()
+    assert not EdgeWaiter(sensor.read, 1, slow_interval=0.1, fast_window=0.1,
+                          fast_interval=0.005).wait(0.5, expected=0.5)
+    # Slow reads over 0.4 s, then fast reads over the last 0.1 s
+    assert 10 <= sensor.reads <= 30
@@ -0,0 +1,83 @@
+import pytest
+
+import trajectories
+from trajectories import TrajectoryCache
+
+SAFE = [0.1, 0.0, 0.3, 0.0, 1.57, 0.0]
+PICK = ["0.1", "0.0", "0.1", "0.0", "1.57", "0.0"]
+
+
+class OldRobot:
+    # pyniryo before 1.1: no trajectory execution
+    def __init__(self):
+        self.moves = []
+
+    def move_pose(self, pose):
+        self.moves.append(pose)
+
+
+class LegacyRobot(OldRobot):
+    # pyniryo 1.1: execute_trajectory_from_poses converts the poses of the list in place
+    def __init__(self):
+        super().__init__()
+        self.trajectories = []
+
+    def execute_trajectory_from_poses(self, list_poses, dist_smoothing=0.0):
+        for i, pose in enumerate(list_poses):
+            list_poses[i] = [value * 2 for value in pose]
+        self.trajectories.append((list_poses, dist_smoothing))
+
+
+class Robot(LegacyRobot):
+    # pyniryo 1.2 or later
+    def execute_trajectory(self, robot_positions, dist_smoothing=0.0):
+        self.trajectories.append(([pose.to_list() for pose in robot_positions], dist_smoothing))
+
+
+def test_compile_removes_duplicates_and_caches():
+    cache = TrajectoryCache()
+    waypoints = cache.compile([SAFE, SAFE, PICK])
+    assert waypoints == [tuple(SAFE), tuple(float(value) for value in PICK)]
+    assert cache.compile([SAFE, SAFE, PICK]) is waypoints
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_compile_rejects_bad_pose():
+    with pytest.raises(ValueError):
+        TrajectoryCache().compile([SAFE, [0.0, 0.0]])
+
+
+def test_cache_size():
+    cache = TrajectoryCache(size=2)
+    for z in (0.1, 0.2, 0.3):
+        cache.compile([SAFE, [0.0, 0.0, z, 0.0, 0.0, 0.0]])
+    assert len(cache._trajectories) == 2
+
+
+@pytest.mark.skipif(trajectories.PoseObject is None, reason="pyniryo not installed")
+def test_execute_trajectory():
+    robot = Robot()
+    cache = TrajectoryCache(blend_radius=0.01)
+    cache.execute(robot, [SAFE, PICK])
+    assert robot.trajectories == [([SAFE, [0.1, 0.0, 0.1, 0.0, 1.57, 0.0]], 0.01)]
+    assert robot.moves == []
+
+
+def test_legacy_execution_leaves_cache_intact(monkeypatch):
+    monkeypatch.setattr(trajectories, "PoseObject", None)
+    robot = LegacyRobot()
+    cache = TrajectoryCache()
+    for _ in range(3):
+        cache.execute(robot, [SAFE, PICK])
+    assert cache.compile([SAFE, PICK]) == [tuple(SAFE), (0.1, 0.0, 0.1, 0.0, 1.57, 0.0)]
+    assert [poses for poses, _ in robot.trajectories] == [[[0.2, 0.0, 0.6, 0.0, 3.14, 0.0],
+                                                           [0.2, 0.0, 0.2, 0.0, 3.14, 0.0]]] * 3
+
+
+def test_single_point_and_old_pyniryo():
+    robot = Robot()
+    TrajectoryCache().execute(robot, [SAFE, SAFE])
+    assert robot.moves == [SAFE] and robot.trajectories == []
+    old = OldRobot()
+    TrajectoryCache().execute(old, [SAFE, PICK])
+    assert old.moves == [SAFE, PICK]
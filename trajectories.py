@@ -0,0 +1,90 @@
+"""
+Multi-waypoint moves of the Ned executed as one smoothed trajectory.
+
+A sequence of move_pose() calls stops the arm at every point and pays a command round trip per
+point. TrajectoryCache compiles the sequence once into a list of (x, y, z, roll, pitch, yaw)
+waypoints and sends it in a single execute_trajectory() call (execute_trajectory_from_poses()
+before pyniryo 1.2), the arm blending through the intermediate waypoints within blend_radius
+(pyniryo's dist_smoothing) and stopping exactly on the last one. Compiled trajectories are cached
+per point set: the named points of the controller rarely change, and a redefined point simply
+makes a new entry. The cached waypoints are tuples, and every call sends new poses built from them.
+"""
+
+from collections import OrderedDict
+
+try:
+    from pyniryo import PoseObject
+except ImportError:
+    PoseObject = None
+
+BLEND_RADIUS = 0.02  # m
+MAX_TRAJECTORIES = 64
+
+
+def _waypoint(point):
+    # pyniryo PoseObject, or a list of 6 coordinates (numbers or numeric strings)
+    if hasattr(point, "to_list"):
+        point = point.to_list()
+    waypoint = tuple(float(value) for value in point)
+    if len(waypoint) != 6:
+        raise ValueError(f"A pose has 6 coordinates, got {len(waypoint)}.")
+    return waypoint
+
+
+class TrajectoryCache:
+    """
+    Least recently used cache of compiled trajectories.
+    """
+    def __init__(self, blend_radius=BLEND_RADIUS, size=MAX_TRAJECTORIES):
+        self.blend_radius = blend_radius
+        self.size = size
+        self._trajectories = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, points):
+        """
+        Returns the waypoints of the trajectory through points (consecutive duplicates removed).
+        Raises ValueError (or TypeError) if a point is not a pose.
+        """
+        key = tuple(_waypoint(point) for point in points)
+        waypoints = self._trajectories.get(key)
+        if waypoints is not None:
+            self._trajectories.move_to_end(key)
+            self.hits += 1
+            return waypoints
+        self.misses += 1
+        waypoints = []
+        for waypoint in key:
+            if not waypoints or waypoints[-1] != waypoint:
+                waypoints.append(waypoint)
+        self._trajectories[key] = waypoints
+        if len(self._trajectories) > self.size:
+            self._trajectories.popitem(last=False)
+        return waypoints
+
+    def clear(self):
+        self._trajectories.clear()
+
+    def execute(self, robot, points):
+        """
+        Moves robot through points in one command. Falls back to one move_pose() per point when
+        the points are not all poses or pyniryo has no trajectory execution (before 1.1).
+        """
+        try:
+            waypoints = self.compile(points)
+        except (ValueError, TypeError):
+            waypoints = None
+        trajectory = PoseObject is not None and hasattr(robot, "execute_trajectory")
+        if waypoints is None or not (trajectory or hasattr(robot, "execute_trajectory_from_poses")):
+            for point in points:
+                robot.move_pose(point)
+        elif len(waypoints) == 1:
+            robot.move_pose(list(waypoints[0]))
+        elif trajectory:
+            robot.execute_trajectory([PoseObject(*waypoint) for waypoint in waypoints],
+                                     dist_smoothing=self.blend_radius)
+        else:
+            # Converts the poses of the list in place: given lists of its own
+            robot.execute_trajectory_from_poses([list(waypoint) for waypoint in waypoints],
+                                                dist_smoothing=self.blend_radius)
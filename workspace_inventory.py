@@ -0,0 +1,111 @@
+"""
+Inventory of the pieces lying in the Ned's workspace, from a single camera image.
+
+detect_object() reports one object per call. WorkspaceInventory takes one image from the observe
+pose and finds every piece in it with pyniryo's vision utilities (OpenCV): shape, color and
+position relative to the workspace, ready for get_target_pose_from_rel(). The list is then kept
+up to date as pieces are picked, so several picks can be planned from one image; it is marked
+stale (to be scanned again) when a new piece is conveyed into the workspace.
+"""
+
+import cv2
+from pyniryo import (ColorHSV, ObjectColor, ObjectShape, biggest_contours_finder, extract_img_workspace,
+                     get_contour_angle, get_contour_barycenter, morphological_transformations,
+                     relative_pos_from_pixels, threshold_hsv, uncompress_image, undistort_image)
+
+# Colors of the pieces and their HSV ranges
+PIECE_COLORS = {
+    ObjectColor.RED: ColorHSV.RED,
+    ObjectColor.GREEN: ColorHSV.GREEN,
+    ObjectColor.BLUE: ColorHSV.BLUE,
+}
+# Width/height ratio of the workspace
+WORKSPACE_RATIO = 1.0
+# Most pieces of one color looked for in an image (contours under 400 px² are ignored by pyniryo)
+MAX_PIECES = 8
+# Area of a contour over the area of its minimum bounding rectangle: 1 for a square, π/4 for a disc
+SQUARE_FILL_RATIO = 0.87
+
+
+class Piece:
+    """
+    A piece seen in the workspace: pyniryo shape and color, and position relative to the
+    workspace (x_rel and y_rel in [0, 1], yaw_rel in radians).
+    """
+    def __init__(self, shape, color, x_rel, y_rel, yaw_rel):
+        self.shape = shape
+        self.color = color
+        self.x_rel = x_rel
+        self.y_rel = y_rel
+        self.yaw_rel = yaw_rel
+
+    @property
+    def rel_pose(self):
+        return [self.x_rel, self.y_rel, self.yaw_rel]
+
+    def __repr__(self):
+        return f"Piece({self.color.name} {self.shape.name} at x_rel={self.x_rel:.3f}, y_rel={self.y_rel:.3f})"
+
+
+def contour_shape(contour):
+    width, height = cv2.minAreaRect(contour)[1]
+    if width * height == 0:
+        return ObjectShape.SQUARE
+    fill_ratio = cv2.contourArea(contour) / (width * height)
+    return ObjectShape.SQUARE if fill_ratio >= SQUARE_FILL_RATIO else ObjectShape.CIRCLE
+
+
+def find_pieces(img_workspace, colors=PIECE_COLORS):
+    """
+    Returns the pieces found in an image of the workspace (as extracted by extract_img_workspace()).
+    """
+    pieces = []
+    for color, hsv in colors.items():
+        mask = morphological_transformations(threshold_hsv(img_workspace, *hsv.value))
+        for contour in biggest_contours_finder(mask, MAX_PIECES):
+            cx, cy = get_contour_barycenter(contour)
+            x_rel, y_rel = relative_pos_from_pixels(img_workspace, cx, cy)
+            shape = contour_shape(contour)
+            # A disc has no orientation
+            yaw_rel = get_contour_angle(contour) if shape == ObjectShape.SQUARE else 0.0
+            pieces.append(Piece(shape, color, x_rel, y_rel, yaw_rel))
+    return pieces
+
+
+class WorkspaceInventory:
+    """
+    Pieces seen at the last scan() of the workspace, minus those removed since. The robot must
+    be at the observe pose when scanning.
+    """
+    def __init__(self, robot):
+        self.robot = robot
+        self.pieces = []
+        self.stale = True
+        self._intrinsics = None
+
+    def capture(self):
+        """
+        Returns the image of the workspace, None if its markers are not all visible.
+        """
+        if self._intrinsics is None:
+            self._intrinsics = self.robot.get_camera_intrinsics()
+        img = undistort_image(uncompress_image(self.robot.get_img_compressed()), *self._intrinsics)
+        return extract_img_workspace(img, workspace_ratio=WORKSPACE_RATIO)
+
+    def scan(self):
+        img_workspace = self.capture()
+        self.pieces = [] if img_workspace is None else find_pieces(img_workspace)
+        self.stale = False
+        return self.pieces
+
+    def find(self, shape, color):
+        """
+        Returns a piece of this shape and color, None if there is none.
+        """
+        for piece in self.pieces:
+            if piece.shape == shape and piece.color == color:
+                return piece
+        return None
+
+    def remove(self, piece):
+        self.pieces.remove(piece)